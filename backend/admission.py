@@ -0,0 +1,220 @@
+"""LLM'e giden istekler için kabul kontrolü: kullanıcı başına token bucket, model başına eşzamanlılık sınırı ve adil bekleme kuyruğu"""
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional
+
+from cache import TTLCache
+from llm import LLM_MAX_CONCURRENCY, LLM_MODEL_CONCURRENCY, parse_model_limits
+from metrics import REGISTRY
+
+
+# Kullanıcı başına: saniyede dolan istek hakkı ve biriktirilebilecek en fazla hak
+ADMISSION_USER_RATE = float(os.environ.get('ADMISSION_USER_RATE', 0.5))
+ADMISSION_USER_BURST = float(os.environ.get('ADMISSION_USER_BURST', 10))
+# Model başına aynı anda işlenen istek; varsayılan LLM gateway sınırlarıyla aynı
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get('ADMISSION_MAX_IN_FLIGHT', LLM_MAX_CONCURRENCY))
+ADMISSION_MODEL_LIMITS = os.environ.get('ADMISSION_MODEL_LIMITS', LLM_MODEL_CONCURRENCY)
+# Sınır doluyken model başına en fazla bekleyen istek ve bekleme süresi
+ADMISSION_QUEUE_SIZE = int(os.environ.get('ADMISSION_QUEUE_SIZE', 50))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT_SECONDS', 10))
+# Fotoğraflı soru (vision) kullanıcının hakkından bu kadar düşer
+ADMISSION_IMAGE_COST = float(os.environ.get('ADMISSION_IMAGE_COST', 3))
+
+QUEUE_DEPTH = REGISTRY.gauge("bilgin_admission_queue_depth", "Slot bekleyen istek sayısı", ("model",))
+IN_FLIGHT = REGISTRY.gauge("bilgin_admission_in_flight", "İşlenmekte olan istek sayısı", ("model",))
+QUEUE_WAIT = REGISTRY.histogram(
+    "bilgin_admission_wait_seconds", "Kabul edilen isteklerin kuyrukta bekleme süresi", ("model",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+REJECTED = REGISTRY.counter(
+    "bilgin_admission_rejected_total", "429 ile reddedilen istekler", ("model", "reason")
+)
+
+
+class AdmissionRejected(Exception):
+    """İstek kabul edilmedi; retry_after saniye sonra tekrar denenebilir"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, cost: float) -> float:
+        """Hak yeterliyse düş ve 0 döndür; değilse yeterli hakkın dolacağı süre"""
+        self._refill()
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        if self.rate <= 0:
+            return math.inf
+        return (cost - self.tokens) / self.rate
+
+    def refund(self, cost: float):
+        self._refill()
+        self.tokens = min(self.burst, self.tokens + cost)
+
+
+class Ticket:
+    """Kabul edilen isteğin slotu; release() birden fazla çağrılabilir"""
+
+    def __init__(self, controller: "AdmissionController", model: str):
+        self.controller = controller
+        self.model = model
+        self.started = time.monotonic()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self.model)
+            self.controller.record_hold(self.model, time.monotonic() - self.started)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+class AdmissionController:
+    """Kabul sırası: önce kullanıcının token bucket'ı (boşsa hemen 429), sonra
+    modelin eşzamanlılık sınırı. Sınır doluysa istek kuyruğa girer; kuyruk da
+    doluysa veya bekleme süresi dolarsa 429. Boşalan slot kullanıcılar arasında
+    sırayla dağıtılır: çok istek atan bir kullanıcı diğerlerinin önüne geçemez.
+    """
+
+    def __init__(self, user_rate: float = ADMISSION_USER_RATE, user_burst: float = ADMISSION_USER_BURST,
+                 max_in_flight: int = ADMISSION_MAX_IN_FLIGHT, model_limits: Optional[Dict[str, int]] = None,
+                 queue_size: int = ADMISSION_QUEUE_SIZE, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_in_flight = max_in_flight
+        self.model_limits = parse_model_limits(ADMISSION_MODEL_LIMITS) if model_limits is None else model_limits
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        # Boşta kalan bucket zaten dolmuş olur; silinmesi davranışı değiştirmez
+        idle_ttl = user_burst / user_rate if user_rate > 0 else 3600
+        self._buckets = TTLCache(maxsize=100000, ttl=idle_ttl)
+        self._in_flight: Dict[str, int] = {}
+        # model -> kullanıcı -> bekleyen future'lar (kullanıcı sırası round-robin)
+        self._waiters: Dict[str, "OrderedDict[str, Deque[asyncio.Future]]"] = {}
+        self._queued: Dict[str, int] = {}
+        # Slot tutma süresinin hareketli ortalaması (Retry-After tahmini için)
+        self._hold_seconds: Dict[str, float] = {}
+
+    def limit(self, model: str) -> int:
+        return self.model_limits.get(model, self.max_in_flight)
+
+    def _bucket(self, user_id: str) -> TokenBucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(self.user_rate, self.user_burst)
+        self._buckets.set(user_id, bucket)
+        return bucket
+
+    def _retry_after(self, model: str) -> int:
+        """Kuyruğun erimesi için tahmini süre"""
+        hold = self._hold_seconds.get(model, 1.0)
+        waiting = self._queued.get(model, 0) + 1
+        return max(1, math.ceil(hold * waiting / self.limit(model)))
+
+    def _reject(self, model: str, reason: str, retry_after: int):
+        REJECTED.inc(model=model, reason=reason)
+        raise AdmissionRejected(reason, retry_after)
+
+    async def acquire(self, user_id: str, model: str, cost: float = 1) -> Ticket:
+        bucket = self._bucket(user_id)
+        wait = bucket.take(cost)
+        if wait:
+            self._reject(model, "rate_limit", max(1, math.ceil(min(wait, 3600))))
+
+        if self._in_flight.get(model, 0) < self.limit(model) and not self._queued.get(model):
+            self._admit(model)
+            QUEUE_WAIT.observe(0.0, model=model)
+            return Ticket(self, model)
+
+        if self._queued.get(model, 0) >= self.queue_size:
+            bucket.refund(cost)
+            self._reject(model, "queue_full", self._retry_after(model))
+
+        future = asyncio.get_running_loop().create_future()
+        queue = self._waiters.setdefault(model, OrderedDict()).setdefault(user_id, deque())
+        queue.append(future)
+        self._set_queued(model, 1)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Slot tam zaman aşımında verildiyse geri bırak
+                self._release(model)
+            else:
+                future.cancel()
+                self._discard(model, user_id, future)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            bucket.refund(cost)
+            self._reject(model, "timeout", self._retry_after(model))
+        QUEUE_WAIT.observe(time.monotonic() - started, model=model)
+        return Ticket(self, model)
+
+    def _admit(self, model: str):
+        self._in_flight[model] = self._in_flight.get(model, 0) + 1
+        IN_FLIGHT.set(self._in_flight[model], model=model)
+
+    def _set_queued(self, model: str, delta: int):
+        self._queued[model] = self._queued.get(model, 0) + delta
+        QUEUE_DEPTH.set(self._queued[model], model=model)
+
+    def _discard(self, model: str, user_id: str, future: asyncio.Future):
+        users = self._waiters.get(model, {})
+        queue = users.get(user_id)
+        if queue and future in queue:
+            queue.remove(future)
+            self._set_queued(model, -1)
+            if not queue:
+                del users[user_id]
+
+    def _release(self, model: str):
+        self._in_flight[model] -= 1
+        users = self._waiters.get(model)
+        # Sıradaki kullanıcının en eski isteğine slotu devret
+        while users:
+            user_id, queue = next(iter(users.items()))
+            future = queue.popleft()
+            self._set_queued(model, -1)
+            del users[user_id]
+            if queue:
+                users[user_id] = queue
+            if not future.done():
+                self._in_flight[model] += 1
+                future.set_result(None)
+                break
+        IN_FLIGHT.set(self._in_flight[model], model=model)
+
+    def record_hold(self, model: str, seconds: float):
+        previous = self._hold_seconds.get(model)
+        self._hold_seconds[model] = seconds if previous is None else previous * 0.8 + seconds * 0.2
+
+    def stats(self) -> dict:
+        return {
+            model: {"in_flight": self._in_flight.get(model, 0), "queued": self._queued.get(model, 0),
+                    "limit": self.limit(model)}
+            for model in set(self._in_flight) | set(self._queued)
+        }
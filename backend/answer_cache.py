@@ -0,0 +1,121 @@
+"""Tekrarlanan sorular için cevap önbelleği: bellek içi + Mongo'da paylaşılan katman"""
+import asyncio
+import hashlib
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+import numpy as np
+
+from cache import TTLCache
+from embeddings import from_bytes, load_embedder, to_bytes
+from retrieval import turkish_lower
+
+
+ANSWER_CACHE_SIZE = int(os.environ.get('ANSWER_CACHE_SIZE', 2000))
+ANSWER_CACHE_TTL = float(os.environ.get('ANSWER_CACHE_TTL', 24 * 3600))
+# 1: birebir eşleşme yoksa aynı kaynaklarla sorulmuş benzer soruların cevabı kullanılır
+ANSWER_CACHE_SEMANTIC = os.environ.get('ANSWER_CACHE_SEMANTIC', '0') == '1'
+ANSWER_CACHE_MIN_SIMILARITY = float(os.environ.get('ANSWER_CACHE_MIN_SIMILARITY', 0.92))
+# Benzerlik aramasında bir kaynak grubundan okunacak en fazla kayıt
+SEMANTIC_CANDIDATES = 200
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_question(question: str) -> str:
+    """"Fotosentez NEDİR?" -> "fotosentez nedir" """
+    return " ".join(_WORD_RE.findall(turkish_lower(question)))
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode('utf-8')).hexdigest()
+
+
+class AnswerCache:
+    """Soru + kaynak parçalar + prompt sürümü anahtarlı cevap önbelleği.
+
+    answer_cache: {key, group, question, chunk_ids, prompt_version, answer,
+                   embedding, created_at, expires_at}
+    group aynı kaynak parçalar ve prompt sürümüdür; benzerlik katmanı yalnızca
+    aynı grup içinde arar, böylece farklı kaynaklara dayanan cevap dönmez.
+    Süresi dolan kayıtları Mongo TTL indeksi siler.
+    """
+
+    def __init__(self, db, embedder=None, semantic: bool = ANSWER_CACHE_SEMANTIC,
+                 maxsize: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL):
+        self.db = db
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.embedder = (embedder or load_embedder()) if semantic else None
+
+    def declare_indexes(self, schema):
+        schema.index("answer_cache", "key", unique=True)
+        schema.index("answer_cache", "group")
+        schema.index("answer_cache", "expires_at", expireAfterSeconds=0)
+
+    def _keys(self, question: str, passages: List[dict], prompt_version: str):
+        normalized = normalize_question(question)
+        chunk_ids = sorted(p["id"] for p in passages)
+        group = _digest(prompt_version, *chunk_ids)
+        return normalized, chunk_ids, group, _digest(group, normalized)
+
+    async def get(self, question: str, passages: List[dict], prompt_version: str) -> Optional[str]:
+        normalized, _, group, key = self._keys(question, passages, prompt_version)
+        if not normalized:
+            return None
+
+        answer = self.local.get(key)
+        if answer is not None:
+            return answer
+
+        now = datetime.now(timezone.utc)
+        entry = await self.db.answer_cache.find_one(
+            {"key": key, "expires_at": {"$gt": now}}, {"_id": 0, "answer": 1}
+        )
+        if entry is None and self.embedder:
+            entry = await self._similar(normalized, group, now)
+        if entry is None:
+            return None
+
+        self.local.set(key, entry["answer"])
+        return entry["answer"]
+
+    async def _similar(self, normalized: str, group: str, now: datetime) -> Optional[dict]:
+        candidates = await self.db.answer_cache.find(
+            {"group": group, "expires_at": {"$gt": now}, "embedding": {"$exists": True}},
+            {"_id": 0, "answer": 1, "embedding": 1}
+        ).limit(SEMANTIC_CANDIDATES).to_list(None)
+        if not candidates:
+            return None
+
+        query = (await asyncio.to_thread(self.embedder.embed, [normalized]))[0]
+        scores = np.vstack([from_bytes(c["embedding"]) for c in candidates]) @ query
+        best = int(np.argmax(scores))
+        return candidates[best] if scores[best] >= ANSWER_CACHE_MIN_SIMILARITY else None
+
+    async def set(self, question: str, passages: List[dict], prompt_version: str, answer: str):
+        normalized, chunk_ids, group, key = self._keys(question, passages, prompt_version)
+        if not normalized:
+            return
+
+        self.local.set(key, answer)
+        now = datetime.now(timezone.utc)
+        entry = {
+            "key": key,
+            "group": group,
+            "question": normalized,
+            "chunk_ids": chunk_ids,
+            "prompt_version": prompt_version,
+            "answer": answer,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=self.ttl)
+        }
+        if self.embedder:
+            vector = (await asyncio.to_thread(self.embedder.embed, [normalized]))[0]
+            entry["embedding"] = to_bytes(vector)
+        await self.db.answer_cache.update_one({"key": key}, {"$set": entry}, upsert=True)
+
+    def stats(self) -> dict:
+        return self.local.stats()
@@ -0,0 +1,81 @@
+"""Eşzamanlı girişlerde bcrypt'in event loop gecikmesine etkisi.
+
+Aynı sayıda şifre doğrulamasını önce doğrudan event loop üzerinde, sonra
+passwords modülünün thread havuzunda çalıştırır ve bu sırada 10 ms'de bir
+uyanan bir ölçüm görevinin ne kadar geç kaldığını raporlar.
+
+    python benchmarks/bcrypt_loop_lag.py --logins 20 --rounds 12
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import passwords  # noqa: E402
+
+
+TICK_SECONDS = 0.01
+
+
+async def measure_lag(stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        samples.append((time.perf_counter() - started - TICK_SECONDS) * 1000)
+
+
+async def blocking_login(password: str, hashed: str):
+    passwords.verify_password_sync(password, hashed)
+
+
+async def pooled_login(password: str, hashed: str):
+    await passwords.verify_password(password, hashed)
+
+
+async def run(mode: str, login, logins: int, hashed: str) -> dict:
+    samples = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(measure_lag(stop, samples))
+    await asyncio.sleep(TICK_SECONDS * 2)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login("benchmark-password", hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await monitor
+    samples.sort()
+    return {
+        "mode": mode,
+        "logins": logins,
+        "total_seconds": round(elapsed, 3),
+        "loop_lag_ms": {
+            "mean": round(statistics.mean(samples), 2),
+            "p95": round(statistics.quantiles(samples, n=20, method="inclusive")[-1], 2) if len(samples) > 1 else round(samples[0], 2),
+            "max": round(samples[-1], 2),
+        },
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=passwords.BCRYPT_ROUNDS)
+    args = parser.parse_args()
+
+    hashed = passwords.hash_password_sync("benchmark-password", args.rounds)
+    results = [
+        await run("event_loop", blocking_login, args.logins, hashed),
+        await run("thread_pool", pooled_login, args.logins, hashed),
+    ]
+    print(json.dumps({"bcrypt_rounds": args.rounds, "workers": passwords.PASSWORD_HASH_WORKERS,
+                      "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,253 @@
+"""Yerel sahte ortamda (mongomock + sahte LLM) uç nokta yük testi.
+
+server.py aynı süreçte, aynı event loop üzerinde çalıştırılır; veritabanı olarak
+mongomock-motor (veya --mongo-url ile verilen geçici bir mongod), LLM olarak
+gecikmesi ayarlanabilen FakeBackend kullanılır. Her iş yükü için p50/p95/p99
+gecikme, RPS, hata sayısı ve event loop gecikmesini JSON olarak yazdırır.
+
+    python benchmarks/load_test.py --users 50 --concurrency 20 --asks 5 --llm-latency-ms 200
+    python benchmarks/load_test.py --workloads register,login,ask --output sonuc.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+WORKLOADS = ["register", "login", "ask", "ask_stream", "ask_image", "upload"]
+TICK_SECONDS = 0.01
+QUESTIONS = [
+    "fotosentez nedir",
+    "newton'un ikinci yasası nedir",
+    "klorofil ne işe yarar",
+    "hücre zarının görevi nedir",
+    "asit ve baz arasındaki fark nedir",
+]
+
+
+def configure_environment(args):
+    """server import edilmeden önce: sahte LLM, geçici dizinler ve veritabanı"""
+    workdir = tempfile.mkdtemp(prefix="bilgin-bench-")
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ["FAKE_LLM_CHUNK_DELAY_MS"] = str(args.llm_chunk_delay_ms)
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    os.environ["BLOB_STORE"] = "local"
+    os.environ["BLOB_DIR"] = os.path.join(workdir, "blobs")
+    os.environ["INGEST_SPOOL_DIR"] = workdir
+    os.environ["DB_NAME"] = f"bilgin_bench_{uuid.uuid4().hex[:8]}"
+    os.environ["MONGO_URL"] = args.mongo_url or "mongodb://localhost:27017"
+    # Az sayıda kullanıcıyla çok istek atılır; kullanıcı başına hak sınırı ölçümü bozmasın
+    os.environ.setdefault("ADMISSION_USER_BURST", "1000000")
+
+    # Test adresleri için DNS sorgusu yapılmasın
+    import email_validator
+    email_validator.CHECK_DELIVERABILITY = False
+
+    if not args.mongo_url:
+        import mongomock_motor
+        import motor.motor_asyncio
+        motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+
+async def measure_lag(stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        samples.append((time.perf_counter() - started - TICK_SECONDS) * 1000)
+
+
+def percentiles(samples: list) -> dict:
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    if len(samples) == 1:
+        value = round(samples[0], 2)
+        return {"p50": value, "p95": value, "p99": value, "max": value}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "p50": round(cuts[49], 2),
+        "p95": round(cuts[94], 2),
+        "p99": round(cuts[98], 2),
+        "max": round(max(samples), 2),
+    }
+
+
+async def run_workload(name: str, calls: list, concurrency: int) -> dict:
+    """calls içindeki coroutine fabrikalarını en fazla `concurrency` eşzamanlı çalıştır"""
+    latencies, errors = [], []
+    lag_samples = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(measure_lag(stop, lag_samples))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(call):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await call()
+                latencies.append((time.perf_counter() - started) * 1000)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed(call) for call in calls))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    return {
+        "workload": name,
+        "requests": len(calls),
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:3],
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency_ms": percentiles(latencies),
+        "loop_lag_ms": percentiles(lag_samples),
+    }
+
+
+def expect(response, *statuses):
+    if response.status_code not in statuses:
+        raise RuntimeError(f"{response.request.method} {response.request.url.path} -> {response.status_code}")
+    return response
+
+
+def make_image() -> bytes:
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (1600, 1200), (30, 120, 200)).save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+async def benchmark(args) -> dict:
+    import httpx
+    import server
+
+    await server.startup_event()
+    transport = httpx.ASGITransport(app=server.app)
+    client = httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120)
+    run_id = uuid.uuid4().hex[:6]
+    users = [
+        {"name": f"Kullanıcı {i}", "email": f"bench-{run_id}-{i}@gmail.com", "password": "benchmark-password"}
+        for i in range(args.users)
+    ]
+    headers = {}
+    results = []
+    workloads = args.workloads.split(",")
+    image = make_image() if "ask_image" in workloads else None
+
+    async def register(user):
+        response = expect(await client.post("/api/register", json=user), 200)
+        headers[user["email"]] = {"Authorization": f"Bearer {response.json()['token']}"}
+
+    async def login(user):
+        response = expect(await client.post("/api/login", json={"email": user["email"], "password": user["password"]}), 200)
+        headers[user["email"]] = {"Authorization": f"Bearer {response.json()['token']}"}
+
+    async def ask(user, i):
+        expect(await client.post(
+            "/api/ask", json={"question": QUESTIONS[i % len(QUESTIONS)]}, headers=headers[user["email"]]
+        ), 200)
+
+    async def ask_stream(user, i):
+        async with client.stream(
+            "POST", "/api/ask/stream", json={"question": QUESTIONS[i % len(QUESTIONS)]}, headers=headers[user["email"]]
+        ) as response:
+            expect(response, 200)
+            async for _ in response.aiter_lines():
+                pass
+
+    async def ask_image(user):
+        expect(await client.post(
+            "/api/ask-image", files={"file": ("soru.jpg", image, "image/jpeg")}, headers=headers[user["email"]]
+        ), 200)
+
+    async def upload(i):
+        content = f"Belge {run_id}-{i}\n" + " ".join(QUESTIONS) * 50
+        response = expect(await client.post(
+            "/api/upload", files={"file": (f"belge-{i}.txt", content.encode("utf-8"), "text/plain")}
+        ), 202)
+        job_id = response.json()["job_id"]
+        while True:
+            job = expect(await client.get(f"/api/upload/{job_id}"), 200).json()
+            if job["status"] == "failed":
+                raise RuntimeError(job["error"])
+            if job["status"] == "done":
+                return
+            await asyncio.sleep(0.02)
+
+    try:
+        # Giriş gerektiren iş yükleri için kullanıcılar her durumda oluşturulur
+        phase = await run_workload("register", [lambda u=u: register(u) for u in users], args.concurrency)
+        if "register" in workloads:
+            results.append(phase)
+        if "login" in workloads:
+            results.append(await run_workload("login", [lambda u=u: login(u) for u in users], args.concurrency))
+        if "upload" in workloads:
+            results.append(await run_workload("upload", [lambda i=i: upload(i) for i in range(args.uploads)], args.concurrency))
+        if "ask" in workloads:
+            calls = [lambda u=u, i=i: ask(u, i) for u in users for i in range(args.asks)]
+            results.append(await run_workload("ask", calls, args.concurrency))
+        if "ask_stream" in workloads:
+            calls = [lambda u=u, i=i: ask_stream(u, i) for u in users for i in range(args.asks)]
+            results.append(await run_workload("ask_stream", calls, args.concurrency))
+        if "ask_image" in workloads:
+            results.append(await run_workload("ask_image", [lambda u=u: ask_image(u) for u in users], args.concurrency))
+    finally:
+        await client.aclose()
+        await asyncio.gather(*server.background_tasks, return_exceptions=True)
+        if args.mongo_url:
+            await server.client.drop_database(os.environ["DB_NAME"])
+        await server.shutdown_db_client()
+
+    return {
+        "config": {
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "asks_per_user": args.asks,
+            "uploads": args.uploads,
+            "llm_latency_ms": args.llm_latency_ms,
+            "bcrypt_rounds": args.bcrypt_rounds,
+            "mongo": "mongod" if args.mongo_url else "mongomock",
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--asks", type=int, default=3, help="kullanıcı başına soru sayısı")
+    parser.add_argument("--uploads", type=int, default=5)
+    parser.add_argument("--workloads", default=",".join(WORKLOADS), help=f"virgülle: {','.join(WORKLOADS)}")
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--llm-chunk-delay-ms", type=float, default=5)
+    parser.add_argument("--bcrypt-rounds", type=int, default=10)
+    parser.add_argument("--mongo-url", default="", help="boşsa mongomock-motor kullanılır")
+    parser.add_argument("--output", default="", help="sonuçların yazılacağı JSON dosyası")
+    args = parser.parse_args()
+
+    unknown = set(args.workloads.split(",")) - set(WORKLOADS)
+    if unknown:
+        parser.error(f"bilinmeyen iş yükü: {', '.join(sorted(unknown))}")
+
+    configure_environment(args)
+    report = asyncio.run(benchmark(args))
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
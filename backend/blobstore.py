@@ -0,0 +1,152 @@
+"""İçerik adresli (SHA-256) blob deposu: yerel dosya sistemi veya GridFS"""
+import asyncio
+import hashlib
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+
+# local: BLOB_DIR altında dosyalar, gridfs: MongoDB GridFS
+BLOB_STORE = os.environ.get('BLOB_STORE', 'local')
+BLOB_DIR = os.environ.get('BLOB_DIR', str(Path(__file__).parent / 'blobs'))
+
+
+class BlobStore:
+    """Blob içeriğini saklar; metadata `blobs` koleksiyonunda tutulur.
+
+    blobs: {id (sha256), content_type, size, created_at, last_used_at, deleting}
+    Aynı içerik ikinci kez yazılmaz, aynı id döner (last_used_at güncellenir).
+    Silinmekte olan (deleting) blob yokmuş gibi davranır; put() onu yeniden yazar.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def declare_indexes(self, schema):
+        schema.index("blobs", "id", unique=True)
+
+    async def put(self, data: bytes, content_type: str) -> str:
+        blob_id = await asyncio.to_thread(lambda: hashlib.sha256(data).hexdigest())
+        now = datetime.now(timezone.utc)
+        # Mesajı henüz yazılmamış blob'u temizleyici silmesin diye kullanım zamanı tutulur
+        existing = await self.db.blobs.update_one(
+            {"id": blob_id, "deleting": {"$ne": True}}, {"$set": {"last_used_at": now}}
+        )
+        # Silme yarışında baytları kaybolmuş kayıt kalıcı bozuk kalmasın, yeniden yazılır
+        if existing.matched_count and await self._exists(blob_id):
+            return blob_id
+
+        await self._write(blob_id, data)
+        await self.db.blobs.update_one(
+            {"id": blob_id},
+            {
+                "$setOnInsert": {
+                    "id": blob_id,
+                    "content_type": content_type,
+                    "size": len(data),
+                    "created_at": now
+                },
+                "$set": {"last_used_at": now},
+                "$unset": {"deleting": ""}
+            },
+            upsert=True
+        )
+        return blob_id
+
+    async def info(self, blob_id: str) -> Optional[dict]:
+        return await self.db.blobs.find_one({"id": blob_id, "deleting": {"$ne": True}}, {"_id": 0})
+
+    async def read(self, blob_id: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        """[start, end] (dahil) aralığındaki baytları oku"""
+        raise NotImplementedError
+
+    async def delete(self, blob_id: str, unused_since: Optional[datetime] = None) -> bool:
+        """Blob'u sil; unused_since verilirse o andan sonra put() ile kullanılan blob silinmez.
+
+        Kayıt önce "deleting" işaretlenir, baytlar silinir, en son kayıt kaldırılır.
+        Arada put() gelirse kaydı canlandırır; canlanan kayıt silinmez.
+        """
+        query = {"id": blob_id}
+        if unused_since is not None:
+            query["last_used_at"] = {"$not": {"$gte": unused_since}}
+        marked = await self.db.blobs.update_one(query, {"$set": {"deleting": True}})
+        if unused_since is not None and not marked.matched_count:
+            return False
+        await self._remove(blob_id)
+        await self.db.blobs.delete_one({"id": blob_id, "deleting": True})
+        return True
+
+    async def _write(self, blob_id: str, data: bytes):
+        raise NotImplementedError
+
+    async def _exists(self, blob_id: str) -> bool:
+        raise NotImplementedError
+
+    async def _remove(self, blob_id: str):
+        raise NotImplementedError
+
+
+class LocalBlobStore(BlobStore):
+    """Blob'ları BLOB_DIR/ab/cd/<sha256> yolunda saklar"""
+
+    def __init__(self, db, root: str = BLOB_DIR):
+        super().__init__(db)
+        self.root = Path(root)
+
+    def _path(self, blob_id: str) -> Path:
+        return self.root / blob_id[:2] / blob_id[2:4] / blob_id
+
+    async def _write(self, blob_id: str, data: bytes):
+        def write():
+            path = self._path(blob_id)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.tmp')
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        await asyncio.to_thread(write)
+
+    async def _exists(self, blob_id: str) -> bool:
+        return await asyncio.to_thread(self._path(blob_id).exists)
+
+    async def read(self, blob_id: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        def read():
+            with open(self._path(blob_id), 'rb') as f:
+                f.seek(start)
+                return f.read() if end is None else f.read(end - start + 1)
+        return await asyncio.to_thread(read)
+
+    async def _remove(self, blob_id: str):
+        await asyncio.to_thread(lambda: self._path(blob_id).unlink(missing_ok=True))
+
+
+class GridFSBlobStore(BlobStore):
+    """Blob'ları GridFS'te dosya adı = sha256 olarak saklar"""
+
+    def __init__(self, db):
+        super().__init__(db)
+        from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name="blob_data")
+
+    async def _write(self, blob_id: str, data: bytes):
+        await self.bucket.upload_from_stream(blob_id, data)
+
+    async def _exists(self, blob_id: str) -> bool:
+        async for _ in self.bucket.find({"filename": blob_id}, limit=1):
+            return True
+        return False
+
+    async def read(self, blob_id: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        stream = await self.bucket.open_download_stream_by_name(blob_id)
+        stream.seek(start)
+        return await stream.read(-1 if end is None else end - start + 1)
+
+    async def _remove(self, blob_id: str):
+        async for grid_file in self.bucket.find({"filename": blob_id}):
+            await self.bucket.delete(grid_file._id)
+
+
+def create_blob_store(db, name: str = BLOB_STORE) -> BlobStore:
+    if name == 'gridfs':
+        return GridFSBlobStore(db)
+    return LocalBlobStore(db)
@@ -0,0 +1,128 @@
+"""Yerel (offline, CPU) embedding hesaplama ve bellek içi vektör indeksi"""
+import logging
+import os
+import re
+import zlib
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = int(os.environ.get('EMBEDDING_DIM', 256))
+# Dolu bir yol verilirse sentence-transformers modeli yerelden yüklenir
+EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', '')
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbedder:
+    """Karakter n-gram'larını sabit boyutlu vektöre hash'leyen embedder.
+
+    Kelimeler "<fotosentezin>" şeklinde sarılıp 3-5 harflik parçalara bölünür;
+    böylece ek almış Türkçe kelimeler kökleriyle aynı boyutları paylaşır.
+    Model dosyası gerektirmez, tamamen deterministiktir.
+    """
+
+    name = "hashing-ngram-v1"
+
+    def __init__(self, dim: int = EMBEDDING_DIM, ngram_range: Tuple[int, int] = (3, 5)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def _features(self, text: str):
+        low, high = self.ngram_range
+        for word in _WORD_RE.findall(text.replace('I', 'ı').replace('İ', 'i').lower()):
+            word = f"<{word}>"
+            for n in range(low, high + 1):
+                for i in range(len(word) - n + 1):
+                    yield zlib.crc32(word[i:i + n].encode('utf-8'))
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            hashes = np.fromiter(self._features(text), dtype=np.uint32)
+            if not hashes.size:
+                continue
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+            np.add.at(matrix[row], hashes % self.dim, signs)
+        # Alt-doğrusal tf ağırlığı, sonra L2 normalizasyonu
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+
+class SentenceTransformerEmbedder:
+    """Yerel diskteki sentence-transformers modeliyle embedding (opsiyonel)"""
+
+    def __init__(self, model_path: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_path, device="cpu")
+        self.name = f"st:{os.path.basename(model_path.rstrip('/'))}"
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return self.model.encode(list(texts), normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+
+def load_embedder():
+    """Yapılandırmaya göre embedder seç; model yüklenemezse hashing'e düş"""
+    if EMBEDDING_MODEL:
+        try:
+            return SentenceTransformerEmbedder(EMBEDDING_MODEL)
+        except Exception as e:
+            logger.warning(f"Embedding modeli yüklenemedi, hashing embedder kullanılıyor: {e}")
+    return HashingEmbedder()
+
+
+class VectorIndex:
+    """Normalize vektörleri tek bir NumPy matrisinde tutar, kosinüs top-k arar"""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._matrix = np.zeros((1024, dim), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray):
+        """Yeni id'ler sona eklenir, var olanların vektörü güncellenir (yeniden indeksleme, açılış yüklemesi)"""
+        vectors = np.asarray(vectors)
+        fresh = []
+        for row, item_id in enumerate(ids):
+            position = self._positions.get(item_id)
+            if position is None:
+                self._positions[item_id] = len(self.ids) + len(fresh)
+                fresh.append(row)
+            else:
+                self._matrix[position] = vectors[row]
+        if not fresh:
+            return
+        needed = len(self.ids) + len(fresh)
+        if needed > self._matrix.shape[0]:
+            grown = np.zeros((max(needed, self._matrix.shape[0] * 2), self.dim), dtype=np.float32)
+            grown[:len(self.ids)] = self._matrix[:len(self.ids)]
+            self._matrix = grown
+        self._matrix[len(self.ids):needed] = vectors[fresh]
+        self.ids.extend(ids[row] for row in fresh)
+
+    def search(self, query: np.ndarray, limit: int, min_score: float = 0.0) -> List[Tuple[str, float]]:
+        count = len(self.ids)
+        if not count:
+            return []
+        scores = self._matrix[:count] @ query
+        limit = min(limit, count)
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top if scores[i] >= min_score]
+
+
+def to_bytes(vector: np.ndarray) -> bytes:
+    return vector.astype(np.float32).tobytes()
+
+
+def from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=np.float32)
@@ -0,0 +1,80 @@
+"""Fotoğraf işleme yardımcıları (Pillow)"""
+import base64
+import os
+from io import BytesIO
+from typing import Tuple
+
+from PIL import Image, ImageOps
+
+
+THUMBNAIL_SIZE = int(os.environ.get('THUMBNAIL_SIZE', 320))
+
+# Vision modeline gönderilmeden önce uzun kenar sınırı ve JPEG kalitesi
+VISION_MAX_EDGE = int(os.environ.get('VISION_MAX_EDGE', 1536))
+VISION_JPEG_QUALITY = int(os.environ.get('VISION_JPEG_QUALITY', 85))
+
+
+def _to_rgb(image: Image.Image) -> Image.Image:
+    """Saydam fotoğrafları beyaz zemine oturtarak RGB'ye çevir"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB') if image.mode != 'RGB' else image
+
+
+def prepare_for_vision(image_bytes: bytes, max_edge: int = VISION_MAX_EDGE,
+                       quality: int = VISION_JPEG_QUALITY) -> Tuple[str, dict]:
+    """EXIF yönünü uygula, küçült, metadata'sız JPEG'e çevir; (base64, istatistik) döndür"""
+    with Image.open(BytesIO(image_bytes)) as image:
+        original_size = image.size
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        image = _to_rgb(image)
+        output = BytesIO()
+        image.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+        processed = output.getvalue()
+
+    stats = {
+        "original_bytes": len(image_bytes),
+        "processed_bytes": len(processed),
+        "saved_bytes": len(image_bytes) - len(processed),
+        "original_size": original_size,
+        "processed_size": image.size,
+    }
+    return base64.b64encode(processed).decode('utf-8'), stats
+
+
+def make_thumbnail(image_bytes: bytes, size: int = THUMBNAIL_SIZE) -> bytes:
+    """Mesaj listesinde gösterilecek küçük JPEG önizleme üret"""
+    with Image.open(BytesIO(image_bytes)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        output = BytesIO()
+        image.save(output, format='JPEG', quality=80, optimize=True)
+        return output.getvalue()
+
+
+# Saklanan orijinalin biçimi korunur; bunların dışındakiler JPEG'e çevrilir
+STORED_FORMATS = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp'}
+STORED_JPEG_QUALITY = int(os.environ.get('STORED_JPEG_QUALITY', 95))
+
+
+def strip_metadata(image_bytes: bytes) -> Tuple[bytes, str]:
+    """EXIF yönünü uygula, EXIF/GPS'siz yeniden kaydet; (bayt, içerik tipi) döndür"""
+    with Image.open(BytesIO(image_bytes)) as image:
+        image_format = image.format if image.format in STORED_FORMATS else 'JPEG'
+        icc_profile = image.info.get('icc_profile')
+        image = ImageOps.exif_transpose(image)
+        options = {'icc_profile': icc_profile} if icc_profile else {}
+        if image_format == 'JPEG':
+            image = _to_rgb(image) if image.mode not in ('RGB', 'L') else image
+            options.update(quality=STORED_JPEG_QUALITY, optimize=True)
+        elif image_format == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        output = BytesIO()
+        image.save(output, format=image_format, **options)
+        return output.getvalue(), STORED_FORMATS[image_format]
@@ -0,0 +1,238 @@
+"""Belge yükleme hattı: diske biriktirme, süreç havuzunda metin çıkarma ve iş takibi"""
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+
+import aiofiles
+import PyPDF2
+from docx import Document
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+
+logger = logging.getLogger(__name__)
+
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', os.cpu_count() or 2))
+INGEST_SPOOL_DIR = os.environ.get('INGEST_SPOOL_DIR', tempfile.gettempdir())
+# Süreç havuzundaki tek görevin sayfa sayısı; gruplar paralel çıkarılır
+PAGE_BATCH_SIZE = int(os.environ.get('PAGE_BATCH_SIZE', 8))
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+
+class ExtractionError(Exception):
+    """Dosyadan metin çıkarılamadı (kullanıcıya gösterilecek mesajla)"""
+
+
+# Süreç havuzunda çalışan fonksiyonlar (modül seviyesinde olmalı ki pickle edilebilsin)
+def count_pages(path: str, file_type: str) -> int:
+    """Çıkarma birimlerinin sayısı: PDF'te sayfa, Word ve TXT'de tek birim"""
+    if file_type != 'pdf':
+        return 1
+    try:
+        return len(PyPDF2.PdfReader(path).pages)
+    except Exception as e:
+        raise ExtractionError(f"PDF okuma hatası: {str(e)}")
+
+
+def extract_pages(path: str, file_type: str, start: int, end: int) -> List[str]:
+    """[start, end) aralığındaki sayfaların metni"""
+    if file_type == 'pdf':
+        try:
+            reader = PyPDF2.PdfReader(path)
+            return [(reader.pages[i].extract_text() or "") + "\n" for i in range(start, end)]
+        except Exception as e:
+            raise ExtractionError(f"PDF okuma hatası: {str(e)}")
+    if file_type == 'docx':
+        try:
+            return ["".join(paragraph.text + "\n" for paragraph in Document(path).paragraphs)]
+        except Exception as e:
+            raise ExtractionError(f"Word dosyası okuma hatası: {str(e)}")
+    try:
+        return [Path(path).read_bytes().decode('utf-8')]
+    except Exception as e:
+        raise ExtractionError(f"Metin dosyası okuma hatası: {str(e)}")
+
+
+class IngestPipeline:
+    """Yüklenen dosyayı arka planda işleyen iş hattı.
+
+    ingest_jobs:    {id, document_id, filename, file_type, sha256, spool_path, status, claim,
+                     pages_total, pages_done, error, duplicate_of, created_at, updated_at}
+    document_pages: {sha256, page, text}  -> dosya içeriğine göre sayfa önbelleği
+
+    status: queued -> processing -> done | failed
+    claim: iş bitene kadar sha256; unique olduğu için aynı içerik aynı anda tek işte işlenir.
+    Aynı baytlar (SHA-256) tekrar yüklenirse mevcut belge kullanılır, dosya
+    yeniden ayrıştırılmaz; yarım kalan işler çıkarılmış sayfaları tekrar kullanır.
+    """
+
+    def __init__(self, db, on_extracted: Callable[[dict, str], Awaitable[dict]]):
+        self.db = db
+        self.on_extracted = on_extracted
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # fork yerine spawn: event loop ve motor thread'leri alt sürece kopyalanmasın
+            self._pool = ProcessPoolExecutor(
+                max_workers=INGEST_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def declare_indexes(self, schema):
+        schema.index("ingest_jobs", "id", unique=True)
+        schema.index("ingest_jobs", "status")
+        schema.index("ingest_jobs", "sha256")
+        schema.index("ingest_jobs", "claim", unique=True, sparse=True)
+        schema.index("document_pages", [("sha256", 1), ("page", 1)], unique=True)
+
+    async def submit(self, upload, file_type: str) -> dict:
+        """Yüklemeyi parça parça diske yazarken hash'le ve iş kaydı oluştur.
+
+        Aynı içerik zaten indekslenmiş belge olarak varsa iş doğrudan "done" olur,
+        aynı içerik şu an işleniyorsa o iş döndürülür. Belge var ama indekslenmemişse
+        (ör. önceki deneme hata aldı) aynı belge id'siyle yeniden işlenir.
+        """
+        job_id = str(uuid.uuid4())
+        spool_path = os.path.join(INGEST_SPOOL_DIR, f"bilgin-upload-{job_id}")
+        digest = hashlib.sha256()
+        size = 0
+        async with aiofiles.open(spool_path, 'wb') as spool:
+            while chunk := await upload.read(SPOOL_CHUNK_SIZE):
+                size += len(chunk)
+                digest.update(chunk)
+                await spool.write(chunk)
+        sha256 = digest.hexdigest()
+
+        while True:
+            document = await self.db.documents.find_one({"sha256": sha256}, {"_id": 0, "id": 1, "index_status": 1})
+            existing = document if document and document.get("index_status", "indexed") == "indexed" else None
+            in_flight = None if existing else await self.db.ingest_jobs.find_one(
+                {"claim": sha256}, {"_id": 0, "spool_path": 0, "claim": 0}
+            )
+            if existing or in_flight:
+                await asyncio.to_thread(lambda: Path(spool_path).unlink(missing_ok=True))
+            if in_flight:
+                return in_flight
+
+            now = datetime.now(timezone.utc)
+            job = {
+                "id": job_id,
+                "document_id": document["id"] if document else str(uuid.uuid4()),
+                "filename": upload.filename,
+                "file_type": file_type,
+                "file_size": size,
+                "sha256": sha256,
+                "spool_path": spool_path,
+                "status": "done" if existing else "queued",
+                "pages_total": None,
+                "pages_done": 0,
+                "error": None,
+                "duplicate_of": existing["id"] if existing else None,
+                "created_at": now,
+                "updated_at": now
+            }
+            try:
+                await self.db.ingest_jobs.insert_one({**job, "claim": sha256} if not existing else dict(job))
+                return job
+            except DuplicateKeyError:
+                # Aynı içerik bu arada başka bir istekle sıraya alındı; o iş bulunup döndürülür
+                continue
+
+    async def status(self, job_id: str) -> Optional[dict]:
+        return await self.db.ingest_jobs.find_one({"id": job_id}, {"_id": 0, "spool_path": 0})
+
+    async def _update(self, job_id: str, **fields):
+        fields["updated_at"] = datetime.now(timezone.utc)
+        update = {"$set": fields}
+        if fields.get("status") in ("done", "failed"):
+            # Biten iş içeriği bırakır; aynı dosya tekrar yüklenebilir
+            update["$unset"] = {"claim": ""}
+        await self.db.ingest_jobs.update_one({"id": job_id}, update)
+
+    async def run(self, job_id: str):
+        """İşi çalıştır: sayfa gruplarını havuzda paralel çıkar, sırayla birleştir, belgeyi oluştur"""
+        # Sıradaki işi atomik olarak al; aynı iş iki kez başlatılırsa ikincisi çıkar
+        job = await self.db.ingest_jobs.find_one_and_update(
+            {"id": job_id, "status": "queued"},
+            {"$set": {"status": "processing", "updated_at": datetime.now(timezone.utc)}}
+        )
+        if not job:
+            return
+
+        loop = asyncio.get_running_loop()
+        path, file_type, sha256 = job["spool_path"], job["file_type"], job["sha256"]
+        tasks: List[asyncio.Task] = []
+        try:
+            pages_total = await loop.run_in_executor(self.pool, count_pages, path, file_type)
+
+            # Aynı dosyanın daha önce çıkarılmış sayfaları tekrar ayrıştırılmaz
+            pages: List[Optional[str]] = [None] * pages_total
+            async for cached in self.db.document_pages.find(
+                {"sha256": sha256, "page": {"$lt": pages_total}}, {"_id": 0, "page": 1, "text": 1}
+            ):
+                pages[cached["page"]] = cached["text"]
+            pages_done = sum(page is not None for page in pages)
+            await self._update(job_id, pages_total=pages_total, pages_done=pages_done)
+
+            async def extract(start: int, end: int):
+                return start, await loop.run_in_executor(self.pool, extract_pages, path, file_type, start, end)
+
+            tasks = [
+                asyncio.ensure_future(extract(start, min(start + PAGE_BATCH_SIZE, pages_total)))
+                for start in range(0, pages_total, PAGE_BATCH_SIZE)
+                if any(page is None for page in pages[start:start + PAGE_BATCH_SIZE])
+            ]
+            for next_batch in asyncio.as_completed(tasks):
+                start, batch = await next_batch
+                pages_done += sum(page is None for page in pages[start:start + len(batch)])
+                pages[start:start + len(batch)] = batch
+                # Aynı sayfa önceki bir denemeden kalmış olabilir; upsert ile tekrar yazılır
+                await self.db.document_pages.bulk_write([
+                    UpdateOne({"sha256": sha256, "page": start + i}, {"$set": {"text": text}}, upsert=True)
+                    for i, text in enumerate(batch)
+                ], ordered=False)
+                await self._update(job_id, pages_done=pages_done)
+
+            content = "".join(pages)
+            if not content.strip():
+                raise ExtractionError("Dosya içeriği boş veya okunamıyor.")
+
+            result = await self.on_extracted({**job, "pages_total": pages_total}, content)
+            await self._update(job_id, status="done", content_length=len(content), **result)
+        except ExtractionError as e:
+            await self._update(job_id, status="failed", error=str(e))
+        except Exception as e:
+            logger.error(f"Belge işleme hatası ({job['filename']}): {str(e)}")
+            await self._update(job_id, status="failed", error=f"Dosya yükleme hatası: {str(e)}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.to_thread(lambda: Path(path).unlink(missing_ok=True))
+
+    async def pending_jobs(self) -> List[str]:
+        """Sunucu yeniden başladığında yarım kalan işler; dosyası kaybolanlar başarısız sayılır"""
+        job_ids = []
+        async for job in self.db.ingest_jobs.find(
+            {"status": {"$in": ["queued", "processing"]}}, {"_id": 0, "id": 1, "spool_path": 1}
+        ):
+            if os.path.exists(job["spool_path"]):
+                await self._update(job["id"], status="queued")
+                job_ids.append(job["id"])
+            else:
+                await self._update(job["id"], status="failed", error="Sunucu yeniden başlatıldı, dosyayı tekrar yükleyin.")
+        return job_ids
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
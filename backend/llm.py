@@ -0,0 +1,348 @@
+"""LLM katmanı: paylaşılan gateway (eşzamanlılık sınırı, zaman aşımı, yeniden deneme) ve sağlayıcı backend'leri"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import uuid
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from metrics import REGISTRY
+
+
+logger = logging.getLogger(__name__)
+
+# emergent: emergentintegrations SDK, http: OpenAI uyumlu API'ye havuzlu HTTP bağlantıları,
+# fake: yerel testler için hazır cevap döndüren backend
+LLM_BACKEND = os.environ.get('LLM_BACKEND', 'emergent')
+LLM_API_BASE = os.environ.get('LLM_API_BASE', 'https://api.openai.com/v1')
+# http backend'inin anahtarı; EMERGENT_LLM_KEY yalnızca emergent backend'inde kullanılır
+LLM_API_KEY = os.environ.get('LLM_API_KEY', '')
+LLM_HTTP_MAX_CONNECTIONS = int(os.environ.get('LLM_HTTP_MAX_CONNECTIONS', 50))
+FAKE_LLM_LATENCY_MS = float(os.environ.get('FAKE_LLM_LATENCY_MS', 50))
+FAKE_LLM_CHUNK_DELAY_MS = float(os.environ.get('FAKE_LLM_CHUNK_DELAY_MS', 10))
+
+# Gateway ayarları; model bazında sınır: LLM_MODEL_CONCURRENCY="gpt-4o=4,gpt-4o-mini=16"
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 8))
+LLM_MODEL_CONCURRENCY = os.environ.get('LLM_MODEL_CONCURRENCY', '')
+LLM_TIMEOUT_SECONDS = float(os.environ.get('LLM_TIMEOUT_SECONDS', 60))
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 2))
+LLM_RETRY_BASE_MS = float(os.environ.get('LLM_RETRY_BASE_MS', 500))
+LLM_RETRY_MAX_MS = float(os.environ.get('LLM_RETRY_MAX_MS', 8000))
+
+
+class TransientLlmError(Exception):
+    """Tekrar denendiğinde geçebilecek sağlayıcı hatası (429, 5xx, bağlantı hatası)"""
+
+
+# SDK'nın (litellm) durum kodu taşımayan geçici hata tipleri
+TRANSIENT_ERROR_NAMES = {"Timeout", "APITimeoutError", "APIConnectionError", "ServiceUnavailableError"}
+
+
+class LlmBackend:
+    """Sağlayıcı arayüzü"""
+
+    async def complete(self, model: str, system_message: str, text: str,
+                       images_base64: Optional[List[str]] = None) -> str:
+        raise NotImplementedError
+
+    async def stream(self, model: str, system_message: str, text: str,
+                     images_base64: Optional[List[str]] = None) -> AsyncIterator[str]:
+        """Varsayılan: cevabı tek parça halinde akıt"""
+        yield await self.complete(model, system_message, text, images_base64)
+
+    def is_retryable(self, error: Exception) -> bool:
+        return isinstance(error, (TransientLlmError, asyncio.TimeoutError))
+
+    async def aclose(self):
+        pass
+
+
+class EmergentBackend(LlmBackend):
+    """emergentintegrations LlmChat üzerinden OpenAI modelleri.
+
+    SDK oturum nesnesini mesaj geçmişiyle birlikte tuttuğu için her çağrıda yeni
+    LlmChat gerekir; bağlantı havuzu isteniyorsa LLM_BACKEND=http kullanılır.
+    SDK parça parça cevap vermediği için stream() tam cevabı tek parça döndürür.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, provider: str = "openai"):
+        self.api_key = api_key or os.environ.get('EMERGENT_LLM_KEY')
+        self.provider = provider
+
+    async def complete(self, model, system_message, text, images_base64=None):
+        from emergentintegrations.llm.chat import LlmChat, UserMessage, ImageContent
+
+        chat = LlmChat(
+            api_key=self.api_key,
+            session_id=str(uuid.uuid4()),
+            system_message=system_message
+        ).with_model(self.provider, model)
+
+        if images_base64:
+            message = UserMessage(
+                text=text,
+                file_contents=[ImageContent(image_base64=image) for image in images_base64]
+            )
+        else:
+            message = UserMessage(text=text)
+        return await chat.send_message(message)
+
+    def is_retryable(self, error: Exception) -> bool:
+        # SDK hata tiplerini dışarı açmıyor: zaman aşımı, bağlantı hatası, 429 ve 5xx tekrar denenir
+        if super().is_retryable(error) or isinstance(error, (TimeoutError, ConnectionError)):
+            return True
+        status = getattr(error, "status_code", None)
+        if isinstance(status, int):
+            return status == 429 or status >= 500
+        return type(error).__name__ in TRANSIENT_ERROR_NAMES
+
+
+class HttpBackend(LlmBackend):
+    """OpenAI uyumlu /chat/completions API'si; tek, uzun ömürlü httpx istemcisi (keep-alive havuzu)"""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: str = LLM_API_BASE,
+                 max_connections: int = LLM_HTTP_MAX_CONNECTIONS):
+        import httpx
+
+        api_key = api_key or LLM_API_KEY
+        if not api_key:
+            logger.warning("LLM_API_KEY tanımlı değil, LLM API istekleri yetkisiz gidecek")
+        self.httpx = httpx
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"Authorization": f"Bearer {api_key}"} if api_key else {},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=10.0)
+        )
+
+    def _payload(self, model, system_message, text, images_base64, stream=False) -> dict:
+        content = text
+        if images_base64:
+            content = [{"type": "text", "text": text}] + [
+                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image}"}}
+                for image in images_base64
+            ]
+        return {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": content}
+            ],
+            "stream": stream
+        }
+
+    def _check(self, response):
+        if response.status_code == 429 or response.status_code >= 500:
+            raise TransientLlmError(f"LLM API {response.status_code}")
+        response.raise_for_status()
+
+    async def complete(self, model, system_message, text, images_base64=None):
+        try:
+            response = await self.client.post(
+                "/chat/completions", json=self._payload(model, system_message, text, images_base64)
+            )
+        except self.httpx.TransportError as e:
+            raise TransientLlmError(str(e)) from e
+        self._check(response)
+        return response.json()["choices"][0]["message"]["content"]
+
+    async def stream(self, model, system_message, text, images_base64=None):
+        try:
+            async with self.client.stream(
+                "POST", "/chat/completions",
+                json=self._payload(model, system_message, text, images_base64, stream=True)
+            ) as response:
+                self._check(response)
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: ") or line == "data: [DONE]":
+                        continue
+                    delta = json.loads(line[6:])["choices"][0]["delta"].get("content")
+                    if delta:
+                        yield delta
+        except self.httpx.TransportError as e:
+            raise TransientLlmError(str(e)) from e
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class FakeBackend(LlmBackend):
+    """Ağa çıkmadan sabit cevap üreten backend (testler ve yük testleri için)"""
+
+    def __init__(self, reply: Optional[str] = None, latency_ms: float = FAKE_LLM_LATENCY_MS,
+                 chunk_delay_ms: float = FAKE_LLM_CHUNK_DELAY_MS):
+        self.reply = reply
+        self.latency_ms = latency_ms
+        self.chunk_delay_ms = chunk_delay_ms
+
+    def _reply_for(self, text: str) -> str:
+        if self.reply is not None:
+            return self.reply
+        return f"Bu, sorunuza verilen örnek bir cevaptır: {text[-80:].strip()}"
+
+    async def complete(self, model, system_message, text, images_base64=None):
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self._reply_for(text)
+
+    async def stream(self, model, system_message, text, images_base64=None):
+        await asyncio.sleep(self.latency_ms / 1000)
+        for i, word in enumerate(self._reply_for(text).split(" ")):
+            yield word if i == 0 else " " + word
+            await asyncio.sleep(self.chunk_delay_ms / 1000)
+
+
+def parse_model_limits(spec: str) -> Dict[str, int]:
+    """"gpt-4o=4,gpt-4o-mini=16" -> {"gpt-4o": 4, "gpt-4o-mini": 16}"""
+    limits = {}
+    for item in spec.split(","):
+        if "=" in item:
+            model, limit = item.split("=", 1)
+            limits[model.strip()] = int(limit)
+    return limits
+
+
+COALESCED = REGISTRY.counter(
+    "bilgin_llm_coalesced_total",
+    "Devam eden aynı prompt'lu çağrının sonucunu paylaşan, LLM'e gitmeyen istekler",
+    ("model",)
+)
+
+
+def prompt_key(model: str, system_message: str, text: str, images_base64: Optional[List[str]] = None) -> str:
+    digest = hashlib.sha256()
+    for part in (model, system_message, text, *(images_base64 or [])):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """Aynı anahtarla eşzamanlı gelen çağrılar tek çağrıyı paylaşır (hepsi aynı sonucu/hatayı alır).
+
+    Paylaşılan çağrı ayrı bir görevdir: bekleyenlerden biri iptal edilse de diğerleri
+    etkilenmez, bekleyen kalmazsa iptal edilir. Çağrı bitince anahtar silinir; sonuç
+    saklanmaz (önbellek değildir).
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, list] = {}  # anahtar -> [görev, bekleyen sayısı]
+
+    def __len__(self):
+        return len(self._calls)
+
+    async def do(self, key: str, factory: Callable[[], Awaitable]) -> tuple:
+        """(sonuç, paylaşıldı mı) döndür"""
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = self._calls[key] = [asyncio.ensure_future(factory()), 0]
+            call[0].add_done_callback(lambda _: self._forget(key, call))
+        call[1] += 1
+        try:
+            return await asyncio.shield(call[0]), shared
+        finally:
+            call[1] -= 1
+            if call[1] == 0 and not call[0].done():
+                # Kimse beklemiyor; yeni gelenler yeni çağrı başlatsın
+                self._forget(key, call)
+                call[0].cancel()
+
+    def _forget(self, key: str, call: list):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+class LlmGateway:
+    """Tüm LLM çağrılarının geçtiği tek nokta.
+
+    Model başına semaphore ile eşzamanlı istek sınırı, çağrı başına zaman aşımı
+    ve geçici hatalarda jitter'lı üstel geri çekilmeyle yeniden deneme uygular.
+    """
+
+    def __init__(self, backend: LlmBackend, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 model_limits: Optional[Dict[str, int]] = None, timeout: float = LLM_TIMEOUT_SECONDS,
+                 max_retries: int = LLM_MAX_RETRIES):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.model_limits = parse_model_limits(LLM_MODEL_CONCURRENCY) if model_limits is None else model_limits
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._flights = SingleFlight()
+
+    def semaphore(self, model: str) -> asyncio.Semaphore:
+        if model not in self._semaphores:
+            self._semaphores[model] = asyncio.Semaphore(self.model_limits.get(model, self.max_concurrency))
+        return self._semaphores[model]
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: [0, min(üst sınır, taban * 2^deneme)] aralığında rastgele bekleme (saniye)"""
+        return random.uniform(0, min(LLM_RETRY_MAX_MS, LLM_RETRY_BASE_MS * 2 ** attempt)) / 1000
+
+    async def complete(self, model: str, system_message: str, text: str,
+                       images_base64: Optional[List[str]] = None, coalesce: bool = False) -> str:
+        """coalesce=True ise aynı prompt için devam eden çağrı varsa onun sonucu beklenir"""
+        if not coalesce:
+            return await self._complete(model, system_message, text, images_base64)
+        answer, shared = await self._flights.do(
+            prompt_key(model, system_message, text, images_base64),
+            lambda: self._complete(model, system_message, text, images_base64)
+        )
+        if shared:
+            COALESCED.inc(model=model)
+        return answer
+
+    async def _complete(self, model: str, system_message: str, text: str,
+                        images_base64: Optional[List[str]] = None) -> str:
+        attempt = 0
+        while True:
+            try:
+                async with self.semaphore(model):
+                    return await asyncio.wait_for(
+                        self.backend.complete(model, system_message, text, images_base64), self.timeout
+                    )
+            except Exception as e:
+                if attempt >= self.max_retries or not self.backend.is_retryable(e):
+                    raise
+                logger.warning(f"LLM çağrısı tekrar deneniyor ({model}, deneme {attempt + 1}): {str(e) or type(e).__name__}")
+            await asyncio.sleep(self.backoff(attempt))
+            attempt += 1
+
+    async def stream(self, model: str, system_message: str, text: str,
+                     images_base64: Optional[List[str]] = None) -> AsyncIterator[str]:
+        """Parça parça cevap; ilk parça gelmeden oluşan hatalarda yeniden dener"""
+        attempt = 0
+        while True:
+            started = False
+            try:
+                async with self.semaphore(model):
+                    tokens = self.backend.stream(model, system_message, text, images_base64)
+                    try:
+                        while True:
+                            try:
+                                token = await asyncio.wait_for(tokens.__anext__(), self.timeout)
+                            except StopAsyncIteration:
+                                return
+                            started = True
+                            yield token
+                    finally:
+                        await tokens.aclose()
+            except Exception as e:
+                if started or attempt >= self.max_retries or not self.backend.is_retryable(e):
+                    raise
+                logger.warning(f"LLM akışı tekrar deneniyor ({model}, deneme {attempt + 1}): {str(e) or type(e).__name__}")
+            await asyncio.sleep(self.backoff(attempt))
+            attempt += 1
+
+    async def aclose(self):
+        await self.backend.aclose()
+
+
+def create_backend(name: str = LLM_BACKEND) -> LlmBackend:
+    if name == 'fake':
+        return FakeBackend()
+    if name == 'http':
+        return HttpBackend()
+    return EmergentBackend()
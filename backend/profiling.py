@@ -0,0 +1,144 @@
+"""Event loop bloklanma dedektörü ve çalışan sunucudan örneklemeli profil (flame graph için folded stacks)"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, Optional, Set
+
+from metrics import REGISTRY
+
+
+logger = logging.getLogger(__name__)
+
+# Heartbeat aralığı ve bu kadar gecikmede bloklayan kodun yığını loglanır
+LOOP_WATCHDOG_INTERVAL_MS = float(os.environ.get('LOOP_WATCHDOG_INTERVAL_MS', 100))
+LOOP_BLOCK_THRESHOLD_MS = float(os.environ.get('LOOP_BLOCK_THRESHOLD_MS', 250))
+PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', 60))
+
+LOOP_LAG = REGISTRY.histogram(
+    "bilgin_event_loop_lag_seconds",
+    "Heartbeat görevinin planlanandan geç uyanma süresi",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+LOOP_BLOCKS = REGISTRY.counter(
+    "bilgin_event_loop_blocks_total",
+    "Gecikmenin LOOP_BLOCK_THRESHOLD_MS'yi aştığı heartbeat sayısı"
+)
+
+
+class ProfilerBusy(Exception):
+    """Aynı anda ikinci bir profil istendi"""
+    pass
+
+
+class LoopWatchdog:
+    """Event loop'ta küçük bir heartbeat görevi ve ayrı bir izleme thread'i çalışır.
+
+    Heartbeat her uyanışında gecikmeyi histograma yazar. Heartbeat eşikten uzun
+    süre gelmezse izleme thread'i loop thread'inin o anki yığınını loglar;
+    bloklayan kod (ör. loop üzerinde çalışan CPU işi) loop serbest kalmadan görülür.
+    """
+
+    def __init__(self, interval_ms: float = LOOP_WATCHDOG_INTERVAL_MS,
+                 threshold_ms: float = LOOP_BLOCK_THRESHOLD_MS):
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self.loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._task is not None:
+            return
+        self.loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        await asyncio.to_thread(self._thread.join)
+        self._task = self._thread = None
+
+    async def _heartbeat(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - started - self.interval)
+            LOOP_LAG.observe(lag)
+            if lag >= self.threshold:
+                LOOP_BLOCKS.inc()
+                logger.warning(f"Event loop {lag * 1000:.0f} ms bloke kaldı")
+            self._last_beat = now
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stop.wait(self.interval / 2):
+            last_beat = self._last_beat
+            stalled = time.monotonic() - last_beat - self.interval
+            # Her bloklanmada bir kez logla
+            if stalled < self.threshold or reported_beat == last_beat:
+                continue
+            reported_beat = last_beat
+            frame = sys._current_frames().get(self.loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "(yığın alınamadı)\n"
+            logger.warning(f"Event loop {stalled * 1000:.0f} ms'dir bloke, şu an çalışan kod:\n{stack}")
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds: float, interval: float, thread_ids: Optional[Set[int]] = None) -> Dict[str, int]:
+    """Thread yığınlarını `interval` aralıkla örnekle; "thread;kök;...;yaprak" -> örnek sayısı"""
+    counts: Dict[str, int] = {}
+    own_id = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id or (thread_ids is not None and thread_id not in thread_ids):
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame))
+                frame = frame.f_back
+            key = ";".join([names.get(thread_id, str(thread_id))] + labels[::-1])
+            counts[key] = counts.get(key, 0) + 1
+        time.sleep(interval)
+    return counts
+
+
+def folded(counts: Dict[str, int]) -> str:
+    """flamegraph.pl / speedscope'un okuduğu "yığın sayı" satırları"""
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+
+
+class SamplingProfiler:
+    """Örnekleme ayrı thread'de yapılır, loop istek işlemeye devam eder; aynı anda tek profil"""
+
+    def __init__(self, max_seconds: float = PROFILE_MAX_SECONDS):
+        self.max_seconds = max_seconds
+        self._lock = asyncio.Lock()
+
+    async def capture(self, seconds: float, interval_ms: float, thread_ids: Optional[Set[int]] = None) -> str:
+        if self._lock.locked():
+            raise ProfilerBusy("Profil zaten alınıyor")
+        async with self._lock:
+            seconds = min(seconds, self.max_seconds)
+            counts = await asyncio.to_thread(sample_stacks, seconds, interval_ms / 1000, thread_ids)
+        logger.info(f"{seconds:g} sn profil alındı ({sum(counts.values())} örnek, {len(counts)} farklı yığın)")
+        return folded(counts)
@@ -0,0 +1,87 @@
+"""Model tokenizer'ı ile token sayımı ve parçaları token bütçesine sığdırma"""
+import logging
+import os
+from functools import lru_cache
+from typing import List, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Sistem mesajı + prompt için toplam bütçe (cevap için kalan pay modele bırakılır)
+PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', 4000))
+# Sabit parçalardan sonra kalan bütçenin kaynak pasajlara ayrılan oranı (geri kalanı sohbet geçmişine)
+PASSAGE_BUDGET_SHARE = float(os.environ.get('PASSAGE_BUDGET_SHARE', 0.6))
+QUESTION_MAX_TOKENS = int(os.environ.get('QUESTION_MAX_TOKENS', 500))
+
+
+def estimate_tokens(text: str) -> int:
+    """Kaba token tahmini (~4 karakter = 1 token), tokenizer yoksa kullanılır"""
+    return len(text) // 4 + 1
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    """tiktoken kuruluysa modelin encoding'i, değilse None (karakter tahmini kullanılır)"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"Tokenizer yüklenemedi ({model}), tahmini sayım kullanılıyor: {e}")
+        return None
+
+
+def token_counter(model: str) -> str:
+    return "tiktoken" if _encoding(model) is not None else "heuristic"
+
+
+def count_tokens(text: str, model: str) -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str) -> str:
+    """Metni en fazla max_tokens token olacak şekilde kelime sınırında kes"""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    encoding = _encoding(model)
+    if encoding is None:
+        cut = text[:max_tokens * 4]
+    else:
+        cut = encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+    if " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut + "…"
+
+
+def pack_best(texts: List[str], budget: int, model: str) -> Tuple[List[int], int]:
+    """Önem sırasıyla verilen parçalardan sığanları seç (sığmayanı atla, sonrakini dene).
+
+    Seçilen indeksleri orijinal sırada ve harcanan token'ı döndürür.
+    """
+    chosen, used = [], 0
+    for i, text in enumerate(texts):
+        tokens = count_tokens(text, model)
+        if used + tokens <= budget:
+            chosen.append(i)
+            used += tokens
+    return chosen, used
+
+
+def pack_recent(texts: List[str], budget: int, model: str) -> Tuple[List[int], int]:
+    """Eskiden yeniye sıralı parçalardan en yenileri sığdır; sığmayan ilk parçada dur"""
+    chosen, used = [], 0
+    for i in range(len(texts) - 1, -1, -1):
+        tokens = count_tokens(texts[i], model)
+        if used + tokens > budget:
+            break
+        chosen.append(i)
+        used += tokens
+    return chosen[::-1], used
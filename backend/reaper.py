@@ -0,0 +1,120 @@
+"""Silinen sohbetlerin arka planda, küçük gruplar halinde temizlenmesi"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Bir seferde silinecek mesaj sayısı ve gruplar arası bekleme (veritabanını boğmamak için)
+REAPER_BATCH_SIZE = int(os.environ.get('REAPER_BATCH_SIZE', 500))
+REAPER_PAUSE_MS = float(os.environ.get('REAPER_PAUSE_MS', 50))
+# Yeni silme gelmese de bu aralıkla bekleyen iş var mı bakılır (diğer worker'lar, yarım kalanlar)
+REAPER_INTERVAL_SECONDS = float(os.environ.get('REAPER_INTERVAL_SECONDS', 60))
+# Silinen chat'e o sırada yazılan turlar ve başka sohbete az önce eklenen fotoğraflar
+# temizlikten korunsun diye bu kadar eski silmeler ve kullanımlar beklenir
+REAPER_GRACE_SECONDS = float(os.environ.get('REAPER_GRACE_SECONDS', 120))
+
+
+class ChatReaper:
+    """Sohbet silme iki adımlıdır:
+
+    1. mark_deleted(): chat kaydına deleted_at yazılır, chat listelerden hemen kaybolur.
+    2. Arka plan görevi, REAPER_GRACE_SECONDS'tan eski silmeleri ele alır: mesajları
+       REAPER_BATCH_SIZE'lık gruplarla siler, başka mesajın kullanmadığı ve yakın
+       zamanda yeniden yüklenmemiş fotoğraf blob'larını kaldırır, en son chat kaydını siler.
+    """
+
+    def __init__(self, db, blob_store, batch_size: int = REAPER_BATCH_SIZE,
+                 pause_ms: float = REAPER_PAUSE_MS, interval: float = REAPER_INTERVAL_SECONDS,
+                 grace: float = REAPER_GRACE_SECONDS):
+        self.db = db
+        self.blob_store = blob_store
+        self.batch_size = batch_size
+        self.pause_ms = pause_ms
+        self.interval = interval
+        self.grace = grace
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def mark_deleted(self, user_id: str, chat_ids: List[str]) -> List[str]:
+        """Kullanıcının chat'lerini gizle; gerçekten gizlenen chat id'lerini döndür"""
+        owned = [
+            chat["id"] async for chat in self.db.chats.find(
+                {"id": {"$in": chat_ids}, "user_id": user_id, "deleted_at": None}, {"_id": 0, "id": 1}
+            )
+        ]
+        if owned:
+            await self.db.chats.update_many(
+                {"id": {"$in": owned}, "deleted_at": None},
+                {"$set": {"deleted_at": datetime.now(timezone.utc)}}
+            )
+            self._wake.set()
+        return owned
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.error(f"Silinen sohbet temizleme hatası: {str(e)}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def reap(self) -> int:
+        """Bekleme süresini doldurmuş silinmiş chat'leri temizle; temizlenen chat sayısını döndür"""
+        reaped, failed = 0, []
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.grace)
+        while True:
+            chats = await self.db.chats.find(
+                {"deleted_at": {"$lte": cutoff}, "id": {"$nin": failed}}, {"_id": 0, "id": 1}
+            ).limit(100).to_list(100)
+            if not chats:
+                break
+            for chat in chats:
+                try:
+                    await self._reap_chat(chat["id"], cutoff)
+                    reaped += 1
+                except Exception as e:
+                    # Hatalı chat bir sonraki turda tekrar denenir, diğerleri beklemez
+                    logger.error(f"Sohbet temizlenemedi ({chat['id']}): {str(e)}")
+                    failed.append(chat["id"])
+        if reaped:
+            logger.info(f"{reaped} silinmiş sohbet temizlendi")
+        return reaped
+
+    async def _reap_chat(self, chat_id: str, cutoff: datetime):
+        blob_ids = set()
+        while True:
+            batch = await self.db.chat_messages.find(
+                {"chat_id": chat_id}, {"_id": 0, "id": 1, "image_id": 1, "thumbnail_id": 1}
+            ).limit(self.batch_size).to_list(self.batch_size)
+            if not batch:
+                break
+            await self.db.chat_messages.delete_many({"id": {"$in": [m["id"] for m in batch]}})
+            blob_ids.update(m[key] for m in batch for key in ("image_id", "thumbnail_id") if m.get(key))
+            await asyncio.sleep(self.pause_ms / 1000)
+
+        # Blob'lar içerik adresli: aynı fotoğrafı kullanan başka mesaj varsa silinmez
+        for blob_id in blob_ids:
+            in_use = await self.db.chat_messages.find_one(
+                {"$or": [{"image_id": blob_id}, {"thumbnail_id": blob_id}]}, {"_id": 1}
+            )
+            if not in_use:
+                await self.blob_store.delete(blob_id, unused_since=cutoff)
+        await self.db.chats.delete_one({"id": chat_id})
@@ -0,0 +1,360 @@
+"""Belge arama: parçalama (chunking), kalıcı ters indeks (inverted index) ve BM25 skorlama"""
+import asyncio
+import logging
+import math
+import os
+import re
+import uuid
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from embeddings import VectorIndex, from_bytes, load_embedder, to_bytes
+
+
+logger = logging.getLogger(__name__)
+
+# BM25 parametreleri
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Türkçe eklerden kurtulmak için kelimenin ilk N harfi terim olarak kullanılır
+# ("fotosentez", "fotosentezin", "fotosentezde" -> "fotos")
+TERM_PREFIX_LENGTH = 5
+
+# Dosya adında geçen kelimeler içerikten daha değerli sayılır
+FILENAME_WEIGHT = 3
+
+# Parça boyutları (karakter) ve soru başına getirilen pasaj sayısı
+# (token bütçesi prompt oluşturulurken modelin tokenizer'ıyla uygulanır)
+CHUNK_SIZE = int(os.environ.get('CHUNK_SIZE', 1200))
+CHUNK_OVERLAP = int(os.environ.get('CHUNK_OVERLAP', 200))
+RETRIEVAL_TOP_K = int(os.environ.get('RETRIEVAL_TOP_K', 5))
+
+# lexical: yalnız BM25, semantic: yalnız vektör, hybrid: ikisinin RRF birleşimi
+RETRIEVAL_MODE = os.environ.get('RETRIEVAL_MODE', 'lexical')
+SEMANTIC_MIN_SCORE = float(os.environ.get('SEMANTIC_MIN_SCORE', 0.05))
+RRF_K = 60
+
+STOPWORDS = {
+    'bir', 'bu', 'şu', 've', 'ile', 'için', 'ne', 'nedir', 'nasıl', 'hangi',
+    'kim', 'niye', 'niçin', 'mi', 'mı', 'mu', 'mü'
+}
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def turkish_lower(text: str) -> str:
+    """Türkçe I/İ harflerini doğru küçült"""
+    return text.replace('I', 'ı').replace('İ', 'i').lower()
+
+
+def tokenize(text: str) -> List[str]:
+    """Metni indeks terimlerine ayır"""
+    terms = []
+    for word in _WORD_RE.findall(turkish_lower(text)):
+        if len(word) < 2 or word in STOPWORDS or word.isdigit():
+            continue
+        terms.append(word[:TERM_PREFIX_LENGTH])
+    return terms
+
+
+def chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[Tuple[int, int]]:
+    """Metni örtüşen parçalara böl, (başlangıç, bitiş) ofsetlerini döndür.
+
+    Parça sınırı mümkünse boşlukta bitirilir ki kelimeler bölünmesin.
+    """
+    spans = []
+    length = len(text)
+    start = 0
+    while start < length:
+        end = min(start + size, length)
+        if end < length:
+            space = text.rfind(' ', start + size // 2, end)
+            if space != -1:
+                end = space
+        spans.append((start, end))
+        if end >= length:
+            break
+        next_start = max(end - overlap, start + 1)
+        space = text.find(' ', next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return spans
+
+
+async def insert_ignoring_duplicates(collection, documents: List[dict]):
+    """Yarım kalmış bir önceki denemeden kalan kayıtları atlayarak ekle"""
+    try:
+        await collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+
+
+class InvertedIndex:
+    """MongoDB'de saklanan ters indeks.
+
+    index_postings: {term, doc_id, tf}    -> terim başına posting listesi
+    index_docs:     {doc_id, length}      -> birim (parça) uzunlukları
+    index_stats:    {_id, doc_count, total_length}
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def declare_indexes(self, schema):
+        schema.index("index_postings", [("term", 1), ("doc_id", 1)], unique=True)
+        schema.index("index_postings", "doc_id")
+        schema.index("index_docs", "doc_id", unique=True)
+
+    async def add_documents(self, items: Iterable[Tuple[str, str, str]]) -> int:
+        """(id, içerik, dosya adı) birimlerini indekse toplu ekle (zaten varsa atla)"""
+        items = list(items)
+        existing = {
+            d["doc_id"] async for d in self.db.index_docs.find(
+                {"doc_id": {"$in": [item[0] for item in items]}}, {"_id": 0, "doc_id": 1}
+            )
+        }
+
+        postings = []
+        lengths = []
+        for doc_id, content, filename in items:
+            if doc_id in existing:
+                continue
+            term_counts = Counter(tokenize(content))
+            for term in tokenize(filename):
+                term_counts[term] += FILENAME_WEIGHT
+            postings.extend(
+                {"term": term, "doc_id": doc_id, "tf": tf}
+                for term, tf in term_counts.items()
+            )
+            lengths.append({"doc_id": doc_id, "length": sum(term_counts.values())})
+
+        if not lengths:
+            return 0
+        if postings:
+            await insert_ignoring_duplicates(self.db.index_postings, postings)
+        await insert_ignoring_duplicates(self.db.index_docs, lengths)
+        await self.db.index_stats.update_one(
+            {"_id": "global"},
+            {"$inc": {"doc_count": len(lengths), "total_length": sum(d["length"] for d in lengths)}},
+            upsert=True
+        )
+        return len(lengths)
+
+    async def search(self, query: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """Sorguya göre BM25 skoruyla sıralı (doc_id, skor) listesi"""
+        query_terms = set(tokenize(query))
+        if not query_terms:
+            return []
+
+        stats = await self.db.index_stats.find_one({"_id": "global"})
+        if not stats or not stats.get("doc_count"):
+            return []
+
+        doc_count = stats["doc_count"]
+        avg_length = stats["total_length"] / doc_count or 1
+
+        postings = await self.db.index_postings.find(
+            {"term": {"$in": list(query_terms)}},
+            {"_id": 0, "term": 1, "doc_id": 1, "tf": 1}
+        ).to_list(None)
+        if not postings:
+            return []
+
+        doc_freq = Counter(p["term"] for p in postings)
+        doc_ids = list({p["doc_id"] for p in postings})
+        lengths: Dict[str, int] = {
+            d["doc_id"]: d["length"]
+            async for d in self.db.index_docs.find(
+                {"doc_id": {"$in": doc_ids}}, {"_id": 0, "doc_id": 1, "length": 1}
+            )
+        }
+
+        scores: Dict[str, float] = {}
+        for p in postings:
+            df = doc_freq[p["term"]]
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths.get(p["doc_id"], avg_length) / avg_length)
+            scores[p["doc_id"]] = scores.get(p["doc_id"], 0.0) + idf * p["tf"] * (BM25_K1 + 1) / (p["tf"] + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+class Retriever:
+    """Belgeleri parçalara ayırıp saklar, soruya en uygun pasajları bulur.
+
+    document_chunks: {id, document_id, filename, seq, start, end, text,
+                      embedding, embedding_model}
+    Ters indeksteki her birim bir parçadır (chunk id). semantic/hybrid modda
+    parça vektörleri Mongo'da saklanır, açılışta arka planda bellekteki matrise
+    yüklenir; yükleme bitene kadar sıralama yalnızca ters indeksle yapılır.
+    """
+
+    def __init__(self, db, mode: str = RETRIEVAL_MODE):
+        self.db = db
+        self.mode = mode
+        self.index = InvertedIndex(db)
+        self.embedder = load_embedder() if mode != 'lexical' else None
+        self.vectors = VectorIndex(self.embedder.dim) if self.embedder else None
+        self.vectors_ready = False
+
+    def declare_indexes(self, schema):
+        schema.index("document_chunks", "id", unique=True)
+        schema.index("document_chunks", [("document_id", 1), ("seq", 1)])
+        self.index.declare_indexes(schema)
+
+    async def ingest(self, document_id: str, filename: str, content: str) -> int:
+        """Belgeyi parçala, parçaları kaydet ve indeksle; parça sayısını döndür.
+
+        Parça id'leri belge id'si ve sıradan türetilir: yarıda kalan bir ingest
+        tekrarlandığında aynı parçalar üzerine yazılır, kopya oluşmaz.
+        """
+        chunks = [
+            {
+                "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"{document_id}/{seq}")),
+                "document_id": document_id,
+                "filename": filename,
+                "seq": seq,
+                "start": start,
+                "end": end,
+                "text": content[start:end]
+            }
+            for seq, (start, end) in enumerate(chunk_text(content))
+            if content[start:end].strip()
+        ]
+        if not chunks:
+            await self._mark_indexed(document_id, 0)
+            return 0
+
+        matrix = None
+        if self.embedder:
+            matrix = await asyncio.to_thread(self.embedder.embed, [c["text"] for c in chunks])
+            for chunk, vector in zip(chunks, matrix):
+                chunk["embedding"] = to_bytes(vector)
+                chunk["embedding_model"] = self.embedder.name
+
+        await self.db.document_chunks.bulk_write(
+            [ReplaceOne({"id": chunk["id"]}, dict(chunk), upsert=True) for chunk in chunks], ordered=False
+        )
+        await self.index.add_documents((c["id"], c["text"], filename) for c in chunks)
+        if matrix is not None:
+            self.vectors.add([c["id"] for c in chunks], matrix)
+        await self._mark_indexed(document_id, len(chunks))
+        return len(chunks)
+
+    async def _mark_indexed(self, document_id: str, chunk_count: int):
+        await self.db.documents.update_one(
+            {"id": document_id}, {"$set": {"chunk_count": chunk_count, "index_status": "indexed"}}
+        )
+
+    async def find_passages(self, question: str, top_k: int = RETRIEVAL_TOP_K) -> List[dict]:
+        """Büyük ölçüde örtüşmeyen en iyi top_k parçayı skor sırasıyla döndür"""
+        ranked = await self.rank(question, limit=top_k * 2)
+        if not ranked:
+            return []
+
+        chunks = {
+            c["id"]: c
+            async for c in self.db.document_chunks.find(
+                {"id": {"$in": [chunk_id for chunk_id, _ in ranked]}},
+                {"_id": 0, "id": 1, "document_id": 1, "filename": 1, "start": 1, "end": 1, "text": 1}
+            )
+        }
+
+        passages = []
+        for chunk_id, score in ranked:
+            chunk = chunks.get(chunk_id)
+            if not chunk or _mostly_covered(chunk, passages):
+                continue
+            chunk["score"] = score
+            passages.append(chunk)
+            if len(passages) >= top_k:
+                break
+        return passages
+
+    async def rank(self, question: str, limit: int) -> List[Tuple[str, float]]:
+        """Moda göre (chunk id, skor) sıralaması"""
+        if self.mode == 'lexical' or not self.vectors_ready:
+            return await self.index.search(question, limit=limit)
+
+        query = (await asyncio.to_thread(self.embedder.embed, [question]))[0]
+        semantic = self.vectors.search(query, limit, SEMANTIC_MIN_SCORE)
+        if self.mode == 'semantic':
+            return semantic
+
+        lexical = await self.index.search(question, limit=limit)
+        return reciprocal_rank_fusion([lexical, semantic])[:limit]
+
+    async def load_vectors(self):
+        """Kayıtlı parça vektörlerini belleğe yükle, eksik olanları hesapla"""
+        if not self.embedder:
+            return
+
+        ids, rows, missing = [], [], []
+        async for chunk in self.db.document_chunks.find(
+            {}, {"_id": 0, "id": 1, "embedding": 1, "embedding_model": 1}
+        ):
+            if chunk.get("embedding_model") == self.embedder.name:
+                ids.append(chunk["id"])
+                rows.append(from_bytes(chunk["embedding"]))
+            else:
+                missing.append(chunk["id"])
+        if ids:
+            self.vectors.add(ids, np.vstack(rows))
+
+        for start in range(0, len(missing), 256):
+            batch = await self.db.document_chunks.find(
+                {"id": {"$in": missing[start:start + 256]}}, {"_id": 0, "id": 1, "text": 1}
+            ).to_list(None)
+            matrix = await asyncio.to_thread(self.embedder.embed, [c["text"] for c in batch])
+            await self.db.document_chunks.bulk_write([
+                UpdateOne(
+                    {"id": chunk["id"]},
+                    {"$set": {"embedding": to_bytes(vector), "embedding_model": self.embedder.name}}
+                )
+                for chunk, vector in zip(batch, matrix)
+            ], ordered=False)
+            self.vectors.add([c["id"] for c in batch], matrix)
+        self.vectors_ready = True
+        logger.info(f"{len(self.vectors)} parça vektörü yüklendi ({self.embedder.name}, {len(missing)} yeni)")
+
+    async def backfill(self):
+        """İndekslenmemiş (eski, yarıda kalmış veya hata almış) belgeleri parçala ve indeksle"""
+        added = 0
+        async for doc in self.db.documents.find(
+            {"index_status": {"$ne": "indexed"}}, {"_id": 0, "id": 1, "filename": 1}
+        ):
+            stored = await self.db.document_contents.find_one({"id": doc["id"]}, {"_id": 0, "content": 1})
+            if not stored:
+                continue
+            try:
+                if await self.ingest(doc["id"], doc.get("filename", ""), stored["content"]):
+                    added += 1
+            except Exception as e:
+                logger.error(f"Belge indeksleme hatası ({doc['id']}): {str(e)}")
+        if added:
+            logger.info(f"{added} belge parçalanıp arama indeksine eklendi")
+
+
+def reciprocal_rank_fusion(rankings: List[List[Tuple[str, float]]]) -> List[Tuple[str, float]]:
+    """Farklı ölçekteki sıralamaları sıra numaralarıyla birleştir (RRF)"""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for position, (item_id, _) in enumerate(ranking):
+            fused[item_id] = fused.get(item_id, 0.0) + 1.0 / (RRF_K + position + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def _mostly_covered(chunk: dict, selected: List[dict]) -> bool:
+    """Örtüşen komşu parça zaten seçildiyse aynı metni iki kez gönderme"""
+    for other in selected:
+        if other["document_id"] != chunk["document_id"]:
+            continue
+        overlap = min(chunk["end"], other["end"]) - max(chunk["start"], other["start"])
+        if overlap * 2 > chunk["end"] - chunk["start"]:
+            return True
+    return False
@@ -0,0 +1,121 @@
+"""Koleksiyon indeks tanımları: idempotent oluşturma ve sık sorguların explain() ile doğrulanması"""
+import logging
+from typing import Dict, Iterator, List, Optional
+
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+
+
+logger = logging.getLogger(__name__)
+
+# Aynı isimli/anahtarlı indeks farklı seçeneklerle zaten var
+INDEX_CONFLICT_CODES = (85, 86)
+DUPLICATE_KEY_CODE = 11000
+# Tekrarlı kayıtlar yüzünden unique kurulamayan indeksin yerine geçen indeksin adı eki
+FALLBACK_SUFFIX = "_nonunique"
+
+
+def _stages(plan) -> Iterator[dict]:
+    """Sorgu planındaki tüm aşamaları (iç içe inputStage/inputStages/queryPlan) gez"""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _stages(item)
+
+
+class SchemaManager:
+    """Gerekli indeksleri koleksiyon bazında tanımlar ve açılışta oluşturur.
+
+    Tanımlanan sık sorgular explain() ile çalıştırılır; kazanan plan koleksiyon
+    taraması (COLLSCAN) ise uyarı loglanır. Sonuçlar `report` içinde tutulur.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.indexes: Dict[str, List[IndexModel]] = {}
+        self.queries: List[dict] = []
+        self.report: List[dict] = []
+
+    def index(self, collection: str, keys, **options):
+        self.indexes.setdefault(collection, []).append(IndexModel(keys, **options))
+
+    def hot_query(self, name: str, collection: str, query: dict, sort: Optional[list] = None):
+        self.queries.append({"name": name, "collection": collection, "query": query, "sort": sort})
+
+    async def ensure(self):
+        """Tanımlı indeksleri oluştur; seçenekleri değişmiş eski indeksleri yeniden kur"""
+        for collection, models in self.indexes.items():
+            for model in models:
+                # Bir indeksin hatası diğerlerinin kurulmasını engellemesin
+                try:
+                    await self._create(self.db[collection], model)
+                except Exception as e:
+                    logger.error(f"{collection}.{model.document['name']} indeksi oluşturulamadı: {str(e)}")
+
+    async def _create(self, collection, model: IndexModel):
+        name = model.document["name"]
+        fallback = name + FALLBACK_SUFFIX
+        if model.document.get("unique") and fallback in await collection.index_information():
+            # Her açılışta indeksi düşürüp yeniden kurmamak için yedek indeks kalıcıdır
+            logger.warning(
+                f"{collection.name}.{name} unique değil: tekrarlı kayıtlar temizlenip {fallback} silinince kurulur"
+            )
+            return
+        try:
+            await collection.create_indexes([model])
+            return
+        except OperationFailure as e:
+            if e.code == DUPLICATE_KEY_CODE:
+                await self._create_fallback(collection, model)
+                return
+            if e.code not in INDEX_CONFLICT_CODES:
+                raise
+        logger.info(f"{collection.name}.{name} indeksi yeni seçeneklerle yeniden oluşturuluyor")
+        await collection.drop_index(name)
+        try:
+            await collection.create_indexes([model])
+        except OperationFailure as e:
+            if e.code != DUPLICATE_KEY_CODE:
+                raise
+            await self._create_fallback(collection, model)
+
+    async def _create_fallback(self, collection, model: IndexModel):
+        """Tekrarlı kayıtlar temizlenene kadar aynı anahtarlarla unique olmayan indeks"""
+        name = model.document["name"]
+        logger.warning(f"{collection.name}.{name} tekrarlı kayıtlar yüzünden unique oluşturulamadı")
+        await collection.create_indexes([
+            IndexModel(list(model.document["key"].items()), name=name + FALLBACK_SUFFIX)
+        ])
+
+    async def verify(self) -> List[dict]:
+        """Sık sorguların indeks kullandığını explain() ile doğrula"""
+        report = []
+        for query in self.queries:
+            entry = {"name": query["name"], "collection": query["collection"], "index": None, "ok": None}
+            cursor = self.db[query["collection"]].find(query["query"])
+            if query["sort"]:
+                cursor = cursor.sort(query["sort"])
+            try:
+                plan = await cursor.explain()
+                stages = list(_stages(plan.get("queryPlanner", {}).get("winningPlan", {})))
+                entry["index"] = next((s["indexName"] for s in stages if "indexName" in s), None)
+                entry["ok"] = not any(s["stage"] == "COLLSCAN" for s in stages) and (
+                    entry["index"] is not None or any(s["stage"] == "IDHACK" for s in stages)
+                )
+            except Exception as e:
+                entry["error"] = str(e)
+            report.append(entry)
+
+        for entry in report:
+            if entry["ok"] is False:
+                logger.warning(f"Sorgu indeks kullanmıyor (COLLSCAN): {entry['name']} ({entry['collection']})")
+            elif entry["ok"] is None:
+                logger.warning(f"Sorgu planı doğrulanamadı: {entry['name']} ({entry.get('error')})")
+        verified = sum(1 for entry in report if entry["ok"])
+        logger.info(f"İndeks doğrulaması: {verified}/{len(report)} sık sorgu indeks kullanıyor")
+        self.report = report
+        return report
@@ -1,26 +1,47 @@
-from fastapi import FastAPI, APIRouter, File, UploadFile, HTTPException, Depends, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, File, UploadFile, HTTPException, Depends, Request, Query, Header
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
+import json
+import base64
+import hashlib
+import hmac
+import re
+import time
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional
 import uuid
 from datetime import datetime, timezone, timedelta
-import PyPDF2
-from docx import Document
-from io import BytesIO
-from emergentintegrations.llm.chat import LlmChat, UserMessage, ImageContent
 import asyncio
+import threading
 import jwt
-import bcrypt
 from email_validator import validate_email, EmailNotValidError
-import base64
-from PIL import Image
+from pymongo import UpdateOne
+from retrieval import Retriever
+from llm import LlmGateway, create_backend
+import passwords
+from cache import TTLCache
+from blobstore import create_blob_store
+from images import make_thumbnail, prepare_for_vision, strip_metadata
+from ingest import IngestPipeline
+from schema import SchemaManager
+from turns import TurnWriter
+from reaper import ChatReaper
+from answer_cache import AnswerCache
+import metrics
+from metrics import span, timed
+from profiling import LoopWatchdog, ProfilerBusy, SamplingProfiler
+from admission import ADMISSION_IMAGE_COST, AdmissionController, AdmissionRejected, Ticket
+from prompting import (
+    PASSAGE_BUDGET_SHARE, PROMPT_TOKEN_BUDGET, QUESTION_MAX_TOKENS,
+    count_tokens, pack_best, pack_recent, token_counter, truncate_tokens
+)
 
 
 ROOT_DIR = Path(__file__).parent
@@ -30,6 +51,23 @@ load_dotenv(ROOT_DIR / '.env')
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-this')
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24 * 30  # 30 gün
+# Token'a ad/e-posta gömülürse çoğu istek kullanıcıyı veritabanından okumaz
+JWT_EMBED_CLAIMS = os.environ.get('JWT_EMBED_CLAIMS', '1') == '1'
+# Yönetim uçları (profil alma) için X-Admin-Token; boşsa bu uçlar kapalı
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+# Blob bağlantıları imzalı ve süreli; bağlantı en az bu kadar süre geçerli kalır
+BLOB_URL_TTL_SECONDS = int(os.environ.get('BLOB_URL_TTL_SECONDS', 3600))
+
+# Kullanıcı önbelleği
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 300))
+
+# Sohbet bağlamı: son mesajlar chat kaydında tutulur, daha eskileri özetlenir
+CONTEXT_RECENT_MESSAGES = int(os.environ.get('CONTEXT_RECENT_MESSAGES', 10))
+CONTEXT_SUMMARIZE_BATCH = int(os.environ.get('CONTEXT_SUMMARIZE_BATCH', 6))
+CONTEXT_MAX_MESSAGES = int(os.environ.get('CONTEXT_MAX_MESSAGES', 40))
+CONTEXT_MESSAGE_MAX_CHARS = int(os.environ.get('CONTEXT_MESSAGE_MAX_CHARS', 2000))
+CONTEXT_SUMMARY_MAX_CHARS = int(os.environ.get('CONTEXT_SUMMARY_MAX_CHARS', 1500))
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
@@ -39,22 +77,74 @@ db = client[os.environ['DB_NAME']]
 # Security
 security = HTTPBearer(auto_error=False)
 
+# Belge arama indeksi
+retriever = Retriever(db)
+
+# Chat fotoğrafları ve önizlemeleri için blob deposu
+blob_store = create_blob_store(db)
+
+# Silinen sohbetleri arka planda temizleyen görev
+chat_reaper = ChatReaper(db, blob_store)
+
+# Kimliği doğrulanmış kullanıcıların önbelleği (user id -> kullanıcı kaydı)
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# Mesaj + chat güncellemelerini gruplayarak yazan tur kaydedici
+turn_writer = TurnWriter(client, db)
+
+# Sohbet geçmişi olmayan soruların cevap önbelleği
+answer_cache = AnswerCache(db, embedder=retriever.embedder)
+
+# Event loop'u bloklayan kodu yakalayan izleyici ve örneklemeli profil
+loop_watchdog = LoopWatchdog()
+profiler = SamplingProfiler()
+
+# Tüm LLM çağrıları bu gateway'den geçer (LLM_BACKEND=fake ile yerel sahte model)
+llm = LlmGateway(create_backend())
+
+# Soru uçlarının kabul kontrolü (kullanıcı başına hak, model başına sınır ve kuyruk)
+admission = AdmissionController()
+
+# İndeks tanımları ve indeks kullanması gereken sık sorgular
+schema = SchemaManager(db)
+schema.index("users", "email", unique=True)
+schema.index("users", "id", unique=True)
+schema.index("chats", "id", unique=True)
+schema.index("chats", [("user_id", 1), ("updated_at", -1), ("id", -1)])
+schema.index("chats", "deleted_at", sparse=True)
+schema.index("chat_messages", "id", unique=True)
+schema.index("chat_messages", [("chat_id", 1), ("timestamp", 1), ("id", 1)])
+schema.index("chat_messages", "image_id")
+schema.index("chat_messages", "thumbnail_id")
+schema.index("documents", "id", unique=True)
+schema.index("documents", "sha256", unique=True, sparse=True)
+schema.index("documents", [("upload_date", -1), ("id", -1)])
+schema.index("document_contents", "id", unique=True)
+retriever.declare_indexes(schema)
+blob_store.declare_indexes(schema)
+answer_cache.declare_indexes(schema)
+
+schema.hot_query("get_current_user", "users", {"id": ""})
+schema.hot_query("login", "users", {"email": ""})
+schema.hot_query("get_user_chats", "chats", {"user_id": "", "deleted_at": None}, [("updated_at", -1), ("id", -1)])
+schema.hot_query("get_or_create_chat", "chats", {"id": "", "user_id": "", "deleted_at": None})
+schema.hot_query("chat_reaper", "chats", {"deleted_at": {"$lte": datetime.now(timezone.utc)}})
+schema.hot_query("chat_reaper_blobs", "chat_messages", {"$or": [{"image_id": ""}, {"thumbnail_id": ""}]})
+schema.hot_query("get_chat_messages", "chat_messages", {"chat_id": ""}, [("timestamp", -1), ("id", -1)])
+schema.hot_query("get_chat_context", "chat_messages", {"chat_id": ""}, [("timestamp", -1)])
+schema.hot_query("delete_chat", "chat_messages", {"chat_id": ""})
+schema.hot_query("upload_dedup", "documents", {"sha256": ""})
+schema.hot_query("get_documents", "documents", {}, [("upload_date", -1), ("id", -1)])
+schema.hot_query("answer_cache", "answer_cache", {"key": ""})
+schema.hot_query("upload_status", "ingest_jobs", {"id": ""})
+
 # MongoDB indexes oluştur
 async def create_indexes():
-    """Veritabanı indexlerini oluştur"""
+    """Veritabanı indexlerini oluştur ve sık sorguların planlarını doğrula"""
     try:
-        # User indexes
-        await db.users.create_index("email", unique=True)
-        await db.users.create_index("id")
-        
-        # Chat indexes
-        await db.chats.create_index([("user_id", 1), ("created_at", -1)])
-        await db.chats.create_index("id")
-        
-        # Document indexes
-        await db.documents.create_index([("content", "text"), ("filename", "text")])
-        
+        await schema.ensure()
         logger.info("MongoDB indexes oluşturuldu")
+        await schema.verify()
     except Exception as e:
         logger.warning(f"Index oluşturma hatası: {e}")
 
@@ -64,7 +154,19 @@ app = FastAPI()
 @app.on_event("startup")
 async def startup_event():
     """Uygulama başlangıcında çalışacak"""
+    loop_watchdog.start()
     await create_indexes()
+    await turn_writer.detect_transactions()
+    chat_reaper.start()
+    # Vektörler arka planda yüklenir; o sırada arama ters indeksle yapılır
+    run_in_background(load_vectors())
+    # Eski belgeleri arka planda taşı, parçala ve indeksle
+    asyncio.create_task(prepare_documents())
+    # Satır içi fotoğraflı eski mesajlar da önizlemeli blob'lara taşınır
+    run_in_background(migrate_message_images())
+    # Yarım kalan yükleme işlerini sürdür
+    for job_id in await ingest_pipeline.pending_jobs():
+        run_in_background(ingest_pipeline.run(job_id))
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -102,6 +204,9 @@ class ChatSession(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     message_count: int = 0
+    # Son mesajlar {id, type, content} ve daha eski mesajların özeti
+    context_turns: List[dict] = []
+    context_summary: str = ""
 
 class ChatMessage(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -110,20 +215,34 @@ class ChatMessage(BaseModel):
     type: str  # 'user' or 'assistant'
     content: str
     timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    image_base64: Optional[str] = None  # Fotoğraf için
+    image_base64: Optional[str] = None  # Eski mesajlarda satır içi fotoğraf
+    image_id: Optional[str] = None  # Blob deposundaki fotoğraf
+    thumbnail_id: Optional[str] = None  # Blob deposundaki önizleme
+    usage: Optional[dict] = None  # AI cevabının token kullanımı
 
 class DocumentModel(BaseModel):
+    """Belge bilgileri; çıkarılan metin document_contents'te ayrı tutulur"""
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     filename: str
-    content: str
     file_type: str
+    sha256: Optional[str] = None
+    content_length: int = 0
+    page_count: Optional[int] = None
+    chunk_count: Optional[int] = None
+    # pending -> indexed (parçalanıp arama indeksine eklendi) veya failed (açılışta tekrar denenir)
+    index_status: str = "pending"
     upload_date: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 async def process_image_with_vision(image_bytes: bytes, user_question: str = None) -> str:
     """OpenAI Vision ile fotoğraf işleme ve yazı okuma"""
     try:
-        # Fotoğrafı base64'e çevir
-        base64_image = base64.b64encode(image_bytes).decode('utf-8')
+        # Fotoğrafı döndür, küçült, metadata'sını sil ve base64'e çevir (thread'de)
+        with span("image.prepare"):
+            base64_image, stats = await asyncio.to_thread(prepare_for_vision, image_bytes)
+        logger.info(
+            f"Vision ön işleme: {stats['original_bytes']} -> {stats['processed_bytes']} bayt "
+            f"({stats['saved_bytes']} bayt tasarruf), {stats['original_size']} -> {stats['processed_size']}"
+        )
         
         # OpenAI Vision için system message
         system_message = """Sen BİLGİN adlı akıllı bir AI asistanısın. Fotoğraflardaki yazıları okur ve soruları cevaplayabilirsin.
@@ -134,12 +253,6 @@ Görevin:
 3. Eğer sadece yazı okuma isteniyorsa yazıları döndür
 4. Türkçe yanıtla, net ve anlaşılır ol"""
 
-        chat = LlmChat(
-            api_key=os.environ.get('EMERGENT_LLM_KEY'),
-            session_id=str(uuid.uuid4()),
-            system_message=system_message
-        ).with_model("openai", "gpt-4o")  # Vision için gpt-4o kullan
-        
         if user_question:
             prompt = f"""Bu fotoğraftaki yazıları oku ve şu soruyu cevapla: {user_question}
 
@@ -153,17 +266,8 @@ Fotoğrafta:
 - Genel bilgi sorusu varsa cevapla
 - Sadece yazı varsa yazıları döndür"""
         
-        # ImageContent ile base64 image gönder
-        image_content = ImageContent(image_base64=base64_image)
-        
-        # Vision mesajı oluştur - emergentintegrations'a uygun format
-        user_message = UserMessage(
-            text=prompt,
-            file_contents=[image_content]
-        )
-        
-        response = await chat.send_message(user_message)
-        return response
+        with span("llm.vision"):
+            return await llm.complete(VISION_MODEL, system_message, prompt, images_base64=[base64_image])
         
     except Exception as e:
         logger.error(f"Fotoğraf işleme hatası: {str(e)}")
@@ -183,23 +287,22 @@ class QuestionResponse(BaseModel):
     answer: str
     chat_id: str
     chat_title: str
+    usage: Optional[dict] = None  # Prompt/cevap token sayıları ve LLM süresi
 
 
 # Helper functions
-def hash_password(password: str) -> str:
-    """Şifreyi hash'le"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-def verify_password(password: str, hashed: str) -> bool:
-    """Şifreyi doğrula"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
-
-def create_access_token(user_id: str) -> str:
+def create_access_token(user: dict) -> str:
     """JWT token oluştur"""
     payload = {
-        "user_id": user_id,
+        "user_id": user['id'],
         "exp": datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
     }
+    if JWT_EMBED_CLAIMS:
+        payload.update({
+            "name": user['name'],
+            "email": user['email'],
+            "created_at": user['created_at'].isoformat()
+        })
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 def get_client_ip(request: Request) -> str:
@@ -209,122 +312,151 @@ def get_client_ip(request: Request) -> str:
         return forwarded.split(",")[0].strip()
     return request.client.host if request.client else "unknown"
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Optional[dict]:
-    """JWT token'dan kullanıcı bilgilerini al"""
+async def load_user(user_id: str) -> Optional[dict]:
+    """Kullanıcı kaydını önbellekten, yoksa veritabanından al"""
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await db.users.find_one({"id": user_id})
+        if user:
+            user_cache.set(user_id, user)
+    return user
+
+def invalidate_user(user_id: str):
+    """Kullanıcı kaydı değiştiğinde önbellekten çıkar"""
+    user_cache.invalidate(user_id)
+
+def decode_token(credentials: Optional[HTTPAuthorizationCredentials]) -> Optional[dict]:
+    """Geçerli token'ın payload'ı; geçersizse None"""
     if not credentials:
         return None
-    
     try:
         payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id = payload.get("user_id")
-        if not user_id:
-            return None
-        
-        user = await db.users.find_one({"id": user_id})
-        return user
-    except jwt.ExpiredSignatureError:
+    except jwt.InvalidTokenError:
         return None
-    except jwt.JWTError:
-        return None
-
-def extract_text_from_pdf(file_bytes):
-    """PDF dosyasından metin çıkarma"""
-    try:
-        pdf_reader = PyPDF2.PdfReader(BytesIO(file_bytes))
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"PDF okuma hatası: {str(e)}")
-
-def extract_text_from_docx(file_bytes):
-    """Word dosyasından metin çıkarma"""
-    try:
-        doc = Document(BytesIO(file_bytes))
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Word dosyası okuma hatası: {str(e)}")
+    return payload if payload.get("user_id") else None
 
-def extract_text_from_txt(file_bytes):
-    """Metin dosyasından içerik çıkarma"""
-    try:
-        return file_bytes.decode('utf-8')
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Metin dosyası okuma hatası: {str(e)}")
-
-async def find_relevant_document(question: str):
-    """Soruya en uygun belgeyi bulma"""
-    documents = await db.documents.find().to_list(1000)
-    
-    if not documents:
+@timed("auth")
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Optional[dict]:
+    """JWT token'dan kullanıcı bilgilerini al"""
+    payload = decode_token(credentials)
+    if not payload:
         return None
     
-    question_clean = question.lower().strip()
-    question_words = set(question_clean.split())
-    
-    stopwords = {'bir', 'bu', 'şu', 've', 'ile', 'için', 'ne', 'nedir', 'nasıl', 'hangi', 'kim', 'niye', 'niçin', 'mi', 'mı', 'mu', 'mü'}
-    question_keywords = question_words - stopwords
-    
-    best_match = None
-    best_score = 0
-    
-    for doc in documents:
-        content_lower = doc['content'].lower()
-        content_words = set(content_lower.split())
-        
-        common_words = question_keywords & content_words
-        word_score = len(common_words) * 2
-        
-        phrase_score = 0
-        for word in question_keywords:
-            if word in content_lower:
-                phrase_score += content_lower.count(word)
-        
-        filename_score = 0
-        filename_lower = doc['filename'].lower()
-        for word in question_keywords:
-            if word in filename_lower:
-                filename_score += 3
-        
-        total_score = word_score + phrase_score + filename_score
-        
-        if total_score > best_score:
-            best_score = total_score
-            best_match = doc
+    # Token gerekli alanları taşıyorsa veritabanına gitme
+    if all(key in payload for key in ("name", "email", "created_at")):
+        return {
+            "id": payload["user_id"],
+            "name": payload["name"],
+            "email": payload["email"],
+            "created_at": payload["created_at"]
+        }
     
-    if best_score < 2:
+    return await load_user(payload["user_id"])
+
+@timed("auth")
+async def get_current_user_record(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Optional[dict]:
+    """Tam kullanıcı kaydı (son giriş IP'si gibi token'da olmayan alanlar için)"""
+    payload = decode_token(credentials)
+    if not payload:
         return None
-        
-    return best_match
+    return await load_user(payload["user_id"])
+
+@timed("retrieval")
+async def find_relevant_passages(question: str) -> List[dict]:
+    """Soruya en uygun belge parçalarını bulma (BM25 ters indeks)"""
+    return await retriever.find_passages(question)
 
-async def get_chat_context(chat_id: str, limit: int = 10) -> str:
-    """Chat geçmişini context olarak al"""
-    messages = await db.chat_messages.find(
-        {"chat_id": chat_id}
-    ).sort("timestamp", 1).limit(limit).to_list(limit)
+def context_turn(message: "ChatMessage") -> dict:
+    return {"id": message.id, "type": message.type, "content": message.content[:CONTEXT_MESSAGE_MAX_CHARS]}
+
+def format_context_turns(turns: List[dict]) -> List[str]:
+    return [f"{'Kullanıcı' if turn['type'] == 'user' else 'BİLGİN'}: {turn['content']}" for turn in turns]
+
+@timed("db.context")
+async def get_chat_context(chat_id: str, limit: int = CONTEXT_RECENT_MESSAGES) -> List[str]:
+    """Chat geçmişini eskiden yeniye satırlar olarak al (özet + son mesajlar, chat kaydından tek okuma)"""
+    chat = await db.chats.find_one({"id": chat_id}, {"_id": 0, "context_turns": 1, "context_summary": 1})
+    if chat is None:
+        return []
     
-    context = ""
-    for msg in messages:
-        role = "Kullanıcı" if msg['type'] == 'user' else "BİLGİN"
-        context += f"\n{role}: {msg['content']}"
+    if "context_turns" not in chat:
+        # Eski chat: son mesajları bir kez oku ve chat kaydına yaz
+        messages = await db.chat_messages.find(
+            {"chat_id": chat_id}, {"_id": 0, "id": 1, "type": 1, "content": 1}
+        ).sort("timestamp", -1).limit(limit).to_list(limit)
+        chat["context_turns"] = [
+            {"id": m["id"], "type": m["type"], "content": m["content"][:CONTEXT_MESSAGE_MAX_CHARS]}
+            for m in reversed(messages)
+        ]
+        await db.chats.update_one(
+            {"id": chat_id, "context_turns": {"$exists": False}},
+            {"$set": {"context_turns": chat["context_turns"]}}
+        )
+    elif len(chat["context_turns"]) >= CONTEXT_RECENT_MESSAGES + CONTEXT_SUMMARIZE_BATCH:
+        # Bağlam uzadı: eski mesajları arka planda özete taşı
+        run_in_background(summarize_chat_context(chat_id))
     
+    context = format_context_turns(chat["context_turns"])
+    if chat.get("context_summary"):
+        context.insert(0, f"Önceki konuşmanın özeti: {chat['context_summary']}")
     return context
 
+@timed("db.persist")
+async def record_turn(chat_id: str, messages: List["ChatMessage"]):
+    """Turu kaydet: mesajlar ve chat güncellemesi (sayaç, son güncelleme, bağlam) birlikte yazılır"""
+    # Mongo zamanı milisaniye hassasiyetle saklar; turdaki mesajların sırası korunsun
+    for previous, message in zip(messages, messages[1:]):
+        if message.timestamp - previous.timestamp < timedelta(milliseconds=1):
+            message.timestamp = previous.timestamp + timedelta(milliseconds=1)
+    await turn_writer.save(chat_id, [m.dict() for m in messages], {
+        "$set": {"updated_at": datetime.now(timezone.utc)},
+        "$inc": {"message_count": len(messages)},
+        "$push": {"context_turns": {
+            "$each": [context_turn(m) for m in messages],
+            "$slice": -CONTEXT_MAX_MESSAGES
+        }}
+    })
+
+CONTEXT_SUMMARY_SYSTEM_MESSAGE = "Sen sohbetleri özetleyen bir asistansın. Verilen önceki özeti ve yeni mesajları, kullanıcının ilgilendiği konuları ve verilen önemli bilgileri koruyarak kısa bir Türkçe paragrafta birleştir."
+
+# Aynı chat için aynı anda tek özetleme
+summarizing_chats = set()
+
+async def summarize_chat_context(chat_id: str):
+    """Son mesajlar dışındaki bağlamı mevcut özetle birleştir ve bağlamdan çıkar"""
+    if chat_id in summarizing_chats:
+        return
+    summarizing_chats.add(chat_id)
+    try:
+        chat = await db.chats.find_one({"id": chat_id}, {"_id": 0, "context_turns": 1, "context_summary": 1})
+        older = (chat or {}).get("context_turns", [])[:-CONTEXT_RECENT_MESSAGES]
+        if len(older) < CONTEXT_SUMMARIZE_BATCH:
+            return
+        
+        prompt = f"Önceki özet: {chat.get('context_summary') or '(yok)'}\n\nYeni mesajlar:\n" + "\n".join(format_context_turns(older))
+        summary = await llm.complete("gpt-4o-mini", CONTEXT_SUMMARY_SYSTEM_MESSAGE, prompt)
+        await db.chats.update_one(
+            {"id": chat_id},
+            {
+                "$set": {"context_summary": summary.strip()[:CONTEXT_SUMMARY_MAX_CHARS]},
+                "$pull": {"context_turns": {"id": {"$in": [turn["id"] for turn in older]}}}
+            }
+        )
+    except Exception as e:
+        logger.error(f"Sohbet özetleme hatası: {str(e)}")
+    finally:
+        summarizing_chats.discard(chat_id)
+
+@timed("llm.title")
 async def generate_chat_title(first_message: str) -> str:
     """İlk mesajdan anlamlı chat title oluştur"""
     try:
-        chat = LlmChat(
-            api_key=os.environ.get('EMERGENT_LLM_KEY'),
-            session_id=str(uuid.uuid4()),
-            system_message="Sen kısa ve anlamlı chat başlıkları oluşturan bir asistansın. Verilen sorudan 2-4 kelimelik Türkçe başlık üret. Genel selamlaşmalarda 'Genel Sohbet' de."
-        ).with_model("openai", "gpt-4o-mini")
-        
-        user_message = UserMessage(text=f"Bu soru için kısa bir başlık oluştur: {first_message[:100]}")
-        response = await chat.send_message(user_message)
+        response = await llm.complete(
+            "gpt-4o-mini",
+            "Sen kısa ve anlamlı chat başlıkları oluşturan bir asistansın. Verilen sorudan 2-4 kelimelik Türkçe başlık üret. Genel selamlaşmalarda 'Genel Sohbet' de.",
+            f"Bu soru için kısa bir başlık oluştur: {first_message[:100]}",
+            coalesce=True
+        )
         
         title = response.strip().replace('"', '').replace("'", '')
         
@@ -343,10 +475,7 @@ async def generate_chat_title(first_message: str) -> str:
         else:
             return f"{' '.join(words[:2]).title()}"
 
-async def get_ai_answer(question: str, chat_context: str = "", document_content: str = None):
-    """AI'dan akıllı ve uygun cevap alma"""
-    try:
-        system_message = """Sen BİLGİN adlı akıllı bir AI asistanısın. Davranış kuralların:
+ANSWER_SYSTEM_MESSAGE = """Sen BİLGİN adlı akıllı bir AI asistanısın. Davranış kuralların:
 
 ARKADAŞ CANLISI DURUMLAR (emoji kullan, samimi ol):
 - Selamlaşma (merhaba, selam, nasılsın)
@@ -368,41 +497,267 @@ ASLA YAPMA:
 - Her cevaba emoji ekleme
 - Kaynak belirtme
 - Başlık ve numaralandırma kullanma"""
-        
-        chat = LlmChat(
-            api_key=os.environ.get('EMERGENT_LLM_KEY'),
-            session_id=str(uuid.uuid4()),
-            system_message=system_message
-        ).with_model("openai", "gpt-4o-mini")
-        
-        prompt_parts = []
-        
-        if chat_context:
-            prompt_parts.append(f"Önceki sohbetimiz:\n{chat_context}\n")
-        
-        if document_content:
-            prompt_parts.append(f"Kaynak bilgiler:\n{document_content[:3000]}\n")
-        
-        prompt_parts.append(f"Kullanıcının sorusu: {question}")
-        
-        # Soru tipini analiz et ve uygun talimat ver
-        question_lower = question.lower()
-        if any(word in question_lower for word in ['merhaba', 'selam', 'nasıl', 'kimsin', 'adın', 'teşekkür']):
-            prompt_parts.append("\nBu arkadaş canlısı bir soru. Samimi ve emoji ile cevapla.")
-        elif any(word in question_lower for word in ['uzun', 'detaylı', 'geniş', 'kapsamlı', 'açıkla']):
-            prompt_parts.append("\nKullanıcı detaylı cevap istiyor. Kapsamlı açıklama yap.")
-        else:
-            prompt_parts.append("\nBu eğitim sorusu. Kısa, net ve profesyonel cevapla.")
-        
-        prompt = "\n".join(prompt_parts)
-        
-        user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
-        
-        return response
+
+ANSWER_MODEL = "gpt-4o-mini"
+VISION_MODEL = "gpt-4o"
+
+# Prompt şablonu veya sistem mesajı değişince artırılmalı (önbellekteki eski cevaplar kullanılmaz)
+PROMPT_VERSION = "2"
+
+AI_ERROR_MESSAGE = "Üzgünüm, şu anda kafam biraz karışık. Biraz sonra tekrar dener misin?"
+
+def answer_instruction(question: str) -> str:
+    """Soru tipini analiz et ve uygun talimatı seç"""
+    question_lower = question.lower()
+    if any(word in question_lower for word in ['merhaba', 'selam', 'nasıl', 'kimsin', 'adın', 'teşekkür']):
+        return "Bu arkadaş canlısı bir soru. Samimi ve emoji ile cevapla."
+    elif any(word in question_lower for word in ['uzun', 'detaylı', 'geniş', 'kapsamlı', 'açıkla']):
+        return "Kullanıcı detaylı cevap istiyor. Kapsamlı açıklama yap."
+    return "Bu eğitim sorusu. Kısa, net ve profesyonel cevapla."
+
+def build_answer_prompt(question: str, chat_context: Optional[List[str]] = None,
+                        passages: Optional[List[dict]] = None, model: str = ANSWER_MODEL,
+                        budget: int = PROMPT_TOKEN_BUDGET):
+    """Soru, sohbet geçmişi ve kaynak pasajlardan token bütçesine sığan prompt oluştur.
+    
+    Önce sistem mesajı, soru ve talimat yerleşir; kalan bütçe kaynaklar (en düşük
+    skorlu önce düşer) ve geçmiş (en eski önce düşer) arasında paylaşılır.
+    (prompt, token kullanımı) döndürür.
+    """
+    history = chat_context or []
+    sources = [f"[{p['filename']}]\n{p['text']}" for p in passages or []]
+    question = truncate_tokens(question, QUESTION_MAX_TOKENS, model)
+    question_part = f"Kullanıcının sorusu: {question}\n\n{answer_instruction(question)}"
+    
+    system_tokens = count_tokens(ANSWER_SYSTEM_MESSAGE, model)
+    question_tokens = count_tokens(question_part, model)
+    available = max(0, budget - system_tokens - question_tokens)
+    
+    # Geçmiş yoksa bütün pay kaynaklara, kullanılmayan kaynak payı geçmişe kalır
+    source_budget = int(available * PASSAGE_BUDGET_SHARE) if history else available
+    kept_sources, source_tokens = pack_best(sources, source_budget, model)
+    kept_history, history_tokens = pack_recent(history, available - source_tokens, model)
+    if len(kept_sources) < len(sources):
+        extra, extra_tokens = pack_best(
+            [text for i, text in enumerate(sources) if i not in kept_sources],
+            available - source_tokens - history_tokens, model
+        )
+        dropped = [i for i in range(len(sources)) if i not in kept_sources]
+        kept_sources = sorted(kept_sources + [dropped[i] for i in extra])
+        source_tokens += extra_tokens
+    
+    prompt_parts = []
+    if kept_history:
+        prompt_parts.append("Önceki sohbetimiz:\n" + "\n".join(history[i] for i in kept_history) + "\n")
+    if kept_sources:
+        prompt_parts.append("Kaynak bilgiler:\n" + "\n\n".join(sources[i] for i in kept_sources) + "\n")
+    prompt_parts.append(question_part)
+    prompt = "\n".join(prompt_parts)
+    
+    usage = {
+        "model": model,
+        "counter": token_counter(model),
+        "budget": budget,
+        "system_tokens": system_tokens,
+        "question_tokens": question_tokens,
+        "history_tokens": history_tokens,
+        "passage_tokens": source_tokens,
+        "prompt_tokens": system_tokens + count_tokens(prompt, model),
+        "dropped_history": len(history) - len(kept_history),
+        "dropped_passages": len(sources) - len(kept_sources)
+    }
+    return prompt, usage
+
+async def get_ai_answer(question: str, chat_context: Optional[List[str]] = None, passages: Optional[List[dict]] = None):
+    """AI'dan akıllı ve uygun cevap alma; (cevap, token kullanımı) döndür"""
+    with span("prompt"):
+        prompt, usage = build_answer_prompt(question, chat_context, passages)
+    started = time.perf_counter()
+    try:
+        with span("llm.answer"):
+            # Aynı anda gelen aynı prompt'lar tek LLM çağrısını paylaşır
+            answer = await llm.complete(ANSWER_MODEL, ANSWER_SYSTEM_MESSAGE, prompt, coalesce=True)
     except Exception as e:
         logger.error(f"AI cevap alma hatası: {str(e)}")
-        return "Üzgünüm, şu anda kafam biraz karışık. Biraz sonra tekrar dener misin?"
+        answer = AI_ERROR_MESSAGE
+    usage["completion_tokens"] = count_tokens(answer, ANSWER_MODEL)
+    usage["llm_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    metrics.record_tokens(ANSWER_MODEL, usage["prompt_tokens"], usage["completion_tokens"])
+    logger.info(f"Token kullanımı: {usage}")
+    return answer, usage
+
+async def stream_ai_answer(prompt: str):
+    """AI cevabını parça parça üret"""
+    async for token in llm.stream(ANSWER_MODEL, ANSWER_SYSTEM_MESSAGE, prompt):
+        yield token
+
+async def admit_llm_request(user_id: str, model: str, cost: float = 1) -> Ticket:
+    """Soruyu LLM sırasına al; hak bittiyse veya kuyruk doluysa Retry-After ile 429"""
+    try:
+        with span("admission"):
+            return await admission.acquire(user_id, model, cost)
+    except AdmissionRejected as e:
+        if e.reason == "rate_limit":
+            detail = "Çok sık soru gönderiyorsun, biraz bekleyip tekrar dene."
+        else:
+            detail = "Şu anda çok yoğunuz, lütfen biraz sonra tekrar dene."
+        raise HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(e.retry_after)})
+
+@timed("db.chat")
+async def get_or_create_chat(chat_id: Optional[str], user_id: str):
+    """Chat'i bul veya oluştur; (chat_id, chat_title, başlık gerekli mi) döndür"""
+    if chat_id:
+        chat = await db.chats.find_one({"id": chat_id, "user_id": user_id, "deleted_at": None})
+        if not chat:
+            raise HTTPException(status_code=404, detail="Chat bulunamadı")
+        return chat_id, chat['title'], chat.get('message_count', 0) == 0
+    
+    # Yeni chat oluştur, başlık arka planda üretilecek
+    chat = ChatSession(user_id=user_id)
+    await db.chats.insert_one(chat.dict())
+    return chat.id, chat.title, True
+
+# Arka plan görevlerine referans tut (GC tarafından toplanmasınlar)
+background_tasks = set()
+
+def run_in_background(coro) -> asyncio.Task:
+    """Coroutine'i cevap yolunu bekletmeden çalıştır"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def update_chat_title(chat_id: str, question: str) -> str:
+    """İlk sorudan başlık üret ve chat'e yaz"""
+    title = await generate_chat_title(question)
+    await db.chats.update_one({"id": chat_id}, {"$set": {"title": title}})
+    return title
+
+def finished_title(title_task: Optional[asyncio.Task], default: str) -> str:
+    """Başlık görevi bittiyse sonucunu, bitmediyse mevcut başlığı döndür"""
+    if title_task and title_task.done() and not title_task.cancelled() and not title_task.exception():
+        return title_task.result()
+    return default
+
+@timed("blob.store")
+async def store_chat_image(image_bytes: bytes):
+    """Fotoğrafı metadata'sız haliyle ve önizlemesiyle blob deposuna yaz; (image_id, thumbnail_id) döndür"""
+    # Biçim, istemcinin bildirdiği tipten değil dosyanın kendisinden belirlenir
+    stored, content_type = await asyncio.to_thread(strip_metadata, image_bytes)
+    thumbnail = await asyncio.to_thread(make_thumbnail, stored)
+    image_id, thumbnail_id = await asyncio.gather(
+        blob_store.put(stored, content_type),
+        blob_store.put(thumbnail, 'image/jpeg')
+    )
+    return image_id, thumbnail_id
+
+MESSAGE_IMAGE_MIGRATE_BATCH = 50
+
+async def migrate_message_images():
+    """Eski mesajlardaki satır içi fotoğrafları (image_base64) blob deposuna taşı"""
+    moved, failed = 0, []
+    while True:
+        batch = await db.chat_messages.find(
+            {"image_base64": {"$type": "string"}, "id": {"$nin": failed}}, {"_id": 0, "id": 1, "image_base64": 1}
+        ).limit(MESSAGE_IMAGE_MIGRATE_BATCH).to_list(MESSAGE_IMAGE_MIGRATE_BATCH)
+        if not batch:
+            break
+        for message in batch:
+            try:
+                # Eski kayıtlar yüklenen dosyayı olduğu gibi saklıyordu (JPEG, PNG veya WebP)
+                image_id, thumbnail_id = await store_chat_image(base64.b64decode(message["image_base64"]))
+                await db.chat_messages.update_one(
+                    {"id": message["id"]},
+                    {"$set": {"image_id": image_id, "thumbnail_id": thumbnail_id}, "$unset": {"image_base64": ""}}
+                )
+                moved += 1
+            except Exception as e:
+                logger.error(f"Mesaj fotoğrafı taşınamadı ({message['id']}): {str(e)}")
+                failed.append(message["id"])
+    if moved:
+        logger.info(f"{moved} mesajın fotoğrafı blob deposuna taşındı")
+
+def sign_blob(blob_id: str, expires: int) -> str:
+    return hmac.new(JWT_SECRET.encode(), f"{blob_id}:{expires}".encode(), hashlib.sha256).hexdigest()
+
+def blob_url(blob_id: Optional[str]) -> Optional[str]:
+    """Süreli imzalı blob bağlantısı üret"""
+    if not blob_id:
+        return None
+    # Bitiş zamanı pencereye yuvarlanır; aynı pencerede URL değişmez, tarayıcı önbelleği çalışır
+    expires = (int(time.time()) // BLOB_URL_TTL_SECONDS + 2) * BLOB_URL_TTL_SECONDS
+    return f"/api/blobs/{blob_id}?expires={expires}&sig={sign_blob(blob_id, expires)}"
+
+def parse_range(range_header: str, size: int):
+    """Tek aralıklı "bytes=a-b" başlığını (start, end) olarak çöz; geçersizse None"""
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    start_text, _, end_text = spec.strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = min(int(end_text), size - 1) if end_text else size - 1
+        else:
+            start = max(size - int(end_text), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        return None
+    return start, end
+
+def encode_cursor(timestamp: datetime, item_id: str) -> str:
+    """Sayfalama imleci: (zaman, id) çiftinin URL-güvenli base64 hali"""
+    raw = json.dumps([timestamp.isoformat(), item_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str):
+    try:
+        timestamp, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(timestamp), item_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Geçersiz sayfalama imleci")
+
+async def keyset_page(collection, query: dict, projection: dict, field: str, limit: int,
+                      before: Optional[str] = None, after: Optional[str] = None):
+    """(field, id) sırasına göre imleçli sayfa.
+    
+    Kayıtları artan sırada döndürür; yanında öncesi ve sonrası için imleçler
+    (daha fazla kayıt yoksa None) gelir. İmleç yoksa en yeni `limit` kayıt.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="before ve after birlikte kullanılamaz")
+    
+    if after:
+        timestamp, item_id = decode_cursor(after)
+        query = {**query, "$or": [{field: {"$gt": timestamp}}, {field: timestamp, "id": {"$gt": item_id}}]}
+        items = await collection.find(query, projection).sort([(field, 1), ("id", 1)]).to_list(limit + 1)
+        has_older, has_newer = True, len(items) > limit
+        items = items[:limit]
+    else:
+        if before:
+            timestamp, item_id = decode_cursor(before)
+            query = {**query, "$or": [{field: {"$lt": timestamp}}, {field: timestamp, "id": {"$lt": item_id}}]}
+        items = await collection.find(query, projection).sort([(field, -1), ("id", -1)]).to_list(limit + 1)
+        has_older, has_newer = len(items) > limit, bool(before)
+        items = items[:limit][::-1]
+    
+    prev_cursor = encode_cursor(items[0][field], items[0]["id"]) if items and has_older else None
+    next_cursor = encode_cursor(items[-1][field], items[-1]["id"]) if items and has_newer else None
+    return items, prev_cursor, next_cursor
+
+def set_cursor_headers(response: Response, prev_cursor: Optional[str], next_cursor: Optional[str]):
+    """Gövde liste olarak kalsın diye imleçler başlıkta döner"""
+    if prev_cursor:
+        response.headers["X-Prev-Cursor"] = prev_cursor
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Server-Sent Events formatında tek olay"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
 
 
 # Authentication Routes
@@ -422,17 +777,19 @@ async def register(user_data: UserRegister, request: Request):
             raise HTTPException(status_code=400, detail="Bu e-posta adresi zaten kayıtlı")
         
         # Create user
+        with span("auth.password"):
+            password_hash = await passwords.hash_password(user_data.password)
         user = User(
             name=user_data.name.strip(),
             email=user_data.email.lower(),
-            password_hash=hash_password(user_data.password),
+            password_hash=password_hash,
             last_ip=get_client_ip(request)
         )
         
         await db.users.insert_one(user.dict())
         
         # Create token
-        token = create_access_token(user.id)
+        token = create_access_token(user.dict())
         
         return {
             "message": "Kayıt başarılı",
@@ -456,24 +813,32 @@ async def login(user_data: UserLogin, request: Request):
     """Kullanıcı girişi"""
     try:
         # Find user
-        user = await db.users.find_one({"email": user_data.email.lower()})
-        if not user or not verify_password(user_data.password, user['password_hash']):
+        with span("db.user"):
+            user = await db.users.find_one({"email": user_data.email.lower()})
+        with span("auth.password"):
+            valid = bool(user) and await passwords.verify_password(user_data.password, user['password_hash'])
+        if not valid:
             raise HTTPException(status_code=401, detail="E-posta veya şifre hatalı")
         
         # Update login info
         client_ip = get_client_ip(request)
+        login_update = {
+            "last_login": datetime.now(timezone.utc),
+            "last_ip": client_ip
+        }
+        
+        # Maliyet faktörü değiştiyse şifreyi yeni ayarla tekrar hash'le
+        if passwords.needs_rehash(user['password_hash']):
+            login_update["password_hash"] = await passwords.hash_password(user_data.password)
+        
         await db.users.update_one(
             {"id": user['id']},
-            {
-                "$set": {
-                    "last_login": datetime.now(timezone.utc),
-                    "last_ip": client_ip
-                }
-            }
+            {"$set": login_update}
         )
+        invalidate_user(user['id'])
         
         # Create token
-        token = create_access_token(user['id'])
+        token = create_access_token(user)
         
         return {
             "message": "Giriş başarılı",
@@ -506,7 +871,7 @@ async def get_profile(current_user: dict = Depends(get_current_user)):
     )
 
 @api_router.get("/check-session")
-async def check_session(request: Request, current_user: dict = Depends(get_current_user)):
+async def check_session(request: Request, current_user: dict = Depends(get_current_user_record)):
     """Session ve IP kontrolü"""
     if not current_user:
         return {"valid": False}
@@ -528,27 +893,29 @@ async def check_session(request: Request, current_user: dict = Depends(get_curre
 
 # Chat Routes
 @api_router.get("/chats")
-async def get_user_chats(current_user: dict = Depends(get_current_user)):
-    """Kullanıcının chat geçmişi"""
+async def get_user_chats(
+    response: Response,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: dict = Depends(get_current_user)
+):
+    """Kullanıcının chat geçmişi (en yeni önce; daha eskiler için X-Prev-Cursor ile before=)"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Oturum açmanız gerekiyor")
     
-    chats = await db.chats.find(
-        {"user_id": current_user['id']}
-    ).sort("updated_at", -1).to_list(50)
+    chats, prev_cursor, next_cursor = await keyset_page(
+        db.chats,
+        {"user_id": current_user['id'], "deleted_at": None},
+        {"_id": 0, "id": 1, "title": 1, "created_at": 1, "updated_at": 1, "message_count": 1},
+        "updated_at", limit, before, after
+    )
+    set_cursor_headers(response, prev_cursor, next_cursor)
     
-    # ObjectId'leri kaldır ve sadece gerekli alanları döndür
-    result = []
     for chat in chats:
-        result.append({
-            "id": chat["id"],
-            "title": chat["title"], 
-            "created_at": chat["created_at"],
-            "updated_at": chat["updated_at"],
-            "message_count": chat.get("message_count", 0)
-        })
+        chat.setdefault("message_count", 0)
     
-    return result
+    return chats[::-1]
 
 @api_router.post("/chat/new")
 async def create_new_chat(current_user: dict = Depends(get_current_user)):
@@ -562,33 +929,41 @@ async def create_new_chat(current_user: dict = Depends(get_current_user)):
     return {"chat_id": chat.id, "title": chat.title}
 
 @api_router.get("/chat/{chat_id}/messages")
-async def get_chat_messages(chat_id: str, current_user: dict = Depends(get_current_user)):
-    """Chat mesajları"""
+async def get_chat_messages(
+    chat_id: str,
+    response: Response,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=1000),
+    include_images: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """Chat mesajları (eskiden yeniye; daha eskiler için X-Prev-Cursor ile before=)"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Oturum açmanız gerekiyor")
     
     # Chat ownership kontrolü
-    chat = await db.chats.find_one({"id": chat_id, "user_id": current_user['id']})
+    chat = await db.chats.find_one({"id": chat_id, "user_id": current_user['id'], "deleted_at": None}, {"_id": 1})
     if not chat:
         raise HTTPException(status_code=404, detail="Chat bulunamadı")
     
-    messages = await db.chat_messages.find(
-        {"chat_id": chat_id}
-    ).sort("timestamp", 1).to_list(1000)
+    projection = {
+        "_id": 0, "id": 1, "chat_id": 1, "type": 1, "content": 1,
+        "timestamp": 1, "image_id": 1, "thumbnail_id": 1
+    }
+    if include_images:
+        projection["image_base64"] = 1
+    
+    messages, prev_cursor, next_cursor = await keyset_page(
+        db.chat_messages, {"chat_id": chat_id}, projection, "timestamp", limit, before, after
+    )
+    set_cursor_headers(response, prev_cursor, next_cursor)
     
-    # ObjectId'leri kaldır ve sadece gerekli alanları döndür
-    result = []
     for msg in messages:
-        result.append({
-            "id": msg["id"],
-            "chat_id": msg["chat_id"],
-            "type": msg["type"],
-            "content": msg["content"],
-            "timestamp": msg["timestamp"],
-            "image_base64": msg.get("image_base64")  # Fotoğraf varsa ekle
-        })
+        msg["image_url"] = blob_url(msg.pop("image_id", None))
+        msg["thumbnail_url"] = blob_url(msg.pop("thumbnail_id", None))
     
-    return result
+    return messages
 
 @api_router.post("/ask-image")
 async def ask_image(
@@ -601,6 +976,7 @@ async def ask_image(
     if not current_user:
         raise HTTPException(status_code=401, detail="Oturum açmanız gerekiyor")
     
+    ticket = None
     try:
         # Desteklenen dosya tiplerini kontrol et
         allowed_types = ['image/jpeg', 'image/png', 'image/jpg', 'image/webp']
@@ -610,16 +986,18 @@ async def ask_image(
                 detail="Sadece JPEG, PNG ve WebP formatları destekleniyor."
             )
         
+        ticket = await admit_llm_request(current_user['id'], VISION_MODEL, ADMISSION_IMAGE_COST)
+        
         # Dosya boyutu kontrolü (max 10MB)
         file_bytes = await file.read()
         if len(file_bytes) > 10 * 1024 * 1024:
             raise HTTPException(status_code=400, detail="Dosya boyutu 10MB'dan küçük olmalı.")
         
-        # Fotoğrafı AI ile işle
-        ai_response = await process_image_with_vision(file_bytes, question if question else None)
-        
-        # Base64 string'i kaydetmek için hazırla
-        base64_image = base64.b64encode(file_bytes).decode('utf-8')
+        # Fotoğrafı AI ile işle, bu sırada fotoğrafı ve önizlemesini blob deposuna yaz
+        ai_response, (image_id, thumbnail_id) = await asyncio.gather(
+            process_image_with_vision(file_bytes, question if question else None),
+            store_chat_image(file_bytes)
+        )
         
         # Chat yoksa veya boşsa oluştur
         if not chat_id or chat_id == "":
@@ -631,7 +1009,7 @@ async def ask_image(
             chat_title = chat.title
         else:
             # Mevcut chat'i kontrol et
-            chat = await db.chats.find_one({"id": chat_id, "user_id": current_user['id']})
+            chat = await db.chats.find_one({"id": chat_id, "user_id": current_user['id'], "deleted_at": None})
             if not chat:
                 # Chat bulunamazsa yeni oluştur
                 chat_title = "Fotoğraf Analizi"
@@ -642,7 +1020,7 @@ async def ask_image(
             else:
                 chat_title = chat['title']
         
-        # Kullanıcı mesajını kaydet (fotoğraf + soru)
+        # Kullanıcı mesajı (fotoğraf + soru)
         user_message_content = f"📸 Fotoğraf yükledi"
         if question:
             user_message_content += f" ve sordu: {question}"
@@ -652,27 +1030,19 @@ async def ask_image(
             user_id=current_user['id'],
             type='user',
             content=user_message_content,
-            image_base64=base64_image  # Fotoğrafı kaydet
+            image_id=image_id,
+            thumbnail_id=thumbnail_id
         )
-        await db.chat_messages.insert_one(user_message.dict())
         
-        # AI cevabını kaydet
         ai_message = ChatMessage(
             chat_id=chat_id,
             user_id=current_user['id'],
             type='assistant',
             content=ai_response
         )
-        await db.chat_messages.insert_one(ai_message.dict())
         
-        # Chat'i güncelle
-        await db.chats.update_one(
-            {"id": chat_id},
-            {
-                "$set": {"updated_at": datetime.now(timezone.utc)},
-                "$inc": {"message_count": 2}
-            }
-        )
+        # Mesajları kaydet ve chat'i güncelle
+        await record_turn(chat_id, [user_message, ai_message])
         
         return QuestionResponse(
             answer=ai_response,
@@ -685,34 +1055,87 @@ async def ask_image(
     except Exception as e:
         logger.error(f"Fotoğraf işleme hatası: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Fotoğraf işlenemedi: {str(e)}")
+    finally:
+        if ticket:
+            ticket.release()
+
+
+@api_router.get("/blobs/{blob_id}")
+async def get_blob(blob_id: str, request: Request, expires: int = 0, sig: str = ""):
+    """Blob içeriği (imzalı bağlantıyla; ETag ve Range destekli, bağlantı süresince önbelleklenir)"""
+    remaining = expires - int(time.time())
+    if remaining <= 0 or not hmac.compare_digest(sig, sign_blob(blob_id, expires)):
+        raise HTTPException(status_code=403, detail="Bağlantının süresi dolmuş veya geçersiz")
+    
+    info = await blob_store.info(blob_id)
+    if not info:
+        raise HTTPException(status_code=404, detail="Dosya bulunamadı")
+    
+    etag = f'"{blob_id}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={remaining}, immutable",
+        "Accept-Ranges": "bytes"
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    
+    size = info["size"]
+    range_header = request.headers.get("range")
+    if range_header:
+        byte_range = parse_range(range_header, size)
+        if not byte_range:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        data = await blob_store.read(blob_id, start, end)
+        return Response(data, status_code=206, media_type=info["content_type"], headers=headers)
+    
+    data = await blob_store.read(blob_id)
+    return Response(data, media_type=info["content_type"], headers=headers)
 
 
 @api_router.delete("/chat/{chat_id}")
 async def delete_chat(chat_id: str, current_user: dict = Depends(get_current_user)):
-    """Chat silme"""
+    """Chat silme (chat hemen gizlenir, mesajlar arka planda silinir)"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Oturum açmanız gerekiyor")
     
+    try:
+        deleted = await chat_reaper.mark_deleted(current_user['id'], [chat_id])
+    except Exception as e:
+        logger.error(f"Chat silme hatası: {str(e)}")
+        raise HTTPException(status_code=500, detail="Chat silinemedi")
+    
     # Chat ownership kontrolü
-    chat = await db.chats.find_one({"id": chat_id, "user_id": current_user['id']})
-    if not chat:
+    if not deleted:
         raise HTTPException(status_code=404, detail="Chat bulunamadı")
     
+    return {"message": "Sohbet başarıyla silindi", "deleted_chat_id": chat_id}
+
+
+class BulkDeleteRequest(BaseModel):
+    chat_ids: List[str]
+
+
+@api_router.post("/chats/delete")
+async def delete_chats(request: BulkDeleteRequest, current_user: dict = Depends(get_current_user)):
+    """Birden fazla chat'i silme"""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Oturum açmanız gerekiyor")
+    
+    if not request.chat_ids:
+        raise HTTPException(status_code=400, detail="Silinecek sohbet seçilmedi")
+    if len(request.chat_ids) > 1000:
+        raise HTTPException(status_code=400, detail="Tek seferde en fazla 1000 sohbet silinebilir")
+    
     try:
-        # Chat mesajlarını sil
-        await db.chat_messages.delete_many({"chat_id": chat_id})
-        
-        # Chat'i sil
-        result = await db.chats.delete_one({"id": chat_id, "user_id": current_user['id']})
-        
-        if result.deleted_count == 0:
-            raise HTTPException(status_code=404, detail="Chat silinemedi")
-        
-        return {"message": "Sohbet başarıyla silindi", "deleted_chat_id": chat_id}
-        
+        deleted = await chat_reaper.mark_deleted(current_user['id'], request.chat_ids)
     except Exception as e:
-        logger.error(f"Chat silme hatası: {str(e)}")
-        raise HTTPException(status_code=500, detail="Chat silinemedi")
+        logger.error(f"Toplu chat silme hatası: {str(e)}")
+        raise HTTPException(status_code=500, detail="Sohbetler silinemedi")
+    
+    return {"message": f"{len(deleted)} sohbet silindi", "deleted_chat_ids": deleted}
 
 
 @api_router.post("/ask")
@@ -721,77 +1144,59 @@ async def ask_question(request: QuestionRequest, current_user: dict = Depends(ge
     if not current_user:
         raise HTTPException(status_code=401, detail="Oturum açmanız gerekiyor")
     
+    ticket = None
     try:
         question = request.question.strip()
         if not question:
             raise HTTPException(status_code=400, detail="Soru boş olamaz")
         
-        chat_id = request.chat_id
-        chat_title = "Yeni Sohbet"
+        ticket = await admit_llm_request(current_user['id'], ANSWER_MODEL)
         
         # Chat varsa kontrol et, yoksa oluştur
-        if chat_id:
-            chat = await db.chats.find_one({"id": chat_id, "user_id": current_user['id']})
-            if not chat:
-                raise HTTPException(status_code=404, detail="Chat bulunamadı")
-            chat_title = chat['title']
-        else:
-            # Yeni chat oluştur
-            chat_title = await generate_chat_title(question)
-            chat = ChatSession(user_id=current_user['id'], title=chat_title)
-            await db.chats.insert_one(chat.dict())
-            chat_id = chat.id
+        chat_id, chat_title, needs_title = await get_or_create_chat(request.chat_id, current_user['id'])
         
-        # Yeni chat ise title oluştur
-        if chat['message_count'] == 0:
-            chat_title = await generate_chat_title(question)
-        else:
-            chat_title = chat['title']
+        # Başlık üretimi cevabı beklemeden paralel çalışır
+        title_task = run_in_background(update_chat_title(chat_id, question)) if needs_title else None
         
-        # Kullanıcı mesajını kaydet
         user_message = ChatMessage(
             chat_id=chat_id,
             user_id=current_user['id'],
             type='user',
             content=question
         )
-        await db.chat_messages.insert_one(user_message.dict())
-        
-        # Chat context al
-        chat_context = await get_chat_context(chat_id, limit=10)
         
-        # İlgili belgeyi bul
-        relevant_doc = await find_relevant_document(question)
-        document_content = relevant_doc['content'] if relevant_doc else None
+        # Chat context al ve ilgili belge parçalarını bul
+        chat_context, passages = await asyncio.gather(
+            get_chat_context(chat_id),
+            find_relevant_passages(question)
+        )
         
-        # AI'dan cevap al
-        answer = await get_ai_answer(question, chat_context, document_content)
+        # Sohbet geçmişi yoksa cevap önbellekten gelebilir, yoksa AI'dan al
+        with span("cache.answer"):
+            answer = await answer_cache.get(question, passages, PROMPT_VERSION) if not chat_context else None
+        usage = {"cached": True}
+        if answer is None:
+            answer, usage = await get_ai_answer(question, chat_context, passages)
+            if not chat_context and answer != AI_ERROR_MESSAGE:
+                run_in_background(answer_cache.set(question, passages, PROMPT_VERSION, answer))
         
-        # AI cevabını kaydet
+        # AI cevabı
         ai_message = ChatMessage(
             chat_id=chat_id,
             user_id=current_user['id'],
             type='assistant',
-            content=answer
+            content=answer,
+            usage=usage
         )
-        await db.chat_messages.insert_one(ai_message.dict())
         
-        # Chat'i güncelle ve title'ı güncelle
-        await db.chats.update_one(
-            {"id": chat_id},
-            {
-                "$set": {
-                    "updated_at": datetime.now(timezone.utc),
-                    "title": chat_title
-                },
-                "$inc": {"message_count": 2}
-            }
-        )
+        # Mesajları kaydet ve chat'i güncelle (başlığı arka plan görevi yazar)
+        await record_turn(chat_id, [user_message, ai_message])
         
         return QuestionResponse(
             answer=answer,
             chat_id=chat_id,
-            chat_title=chat_title
+            chat_title=finished_title(title_task, chat_title),
+            usage=usage
         )
         
     except HTTPException:
@@ -799,12 +1204,230 @@ async def ask_question(request: QuestionRequest, current_user: dict = Depends(ge
     except Exception as e:
         logger.error(f"Soru cevaplama hatası: {str(e)}")
         raise HTTPException(status_code=500, detail="Soru cevaplanamadı")
+    finally:
+        if ticket:
+            ticket.release()
+
+
+@api_router.post("/ask/stream")
+async def ask_question_stream(request: QuestionRequest, current_user: dict = Depends(get_current_user)):
+    """Soru sorma (cevap SSE ile parça parça akar)"""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Oturum açmanız gerekiyor")
+    
+    question = request.question.strip()
+    if not question:
+        raise HTTPException(status_code=400, detail="Soru boş olamaz")
+    
+    # Slot akış bitene kadar tutulur
+    ticket = await admit_llm_request(current_user['id'], ANSWER_MODEL)
+    try:
+        chat_id, chat_title, needs_title = await get_or_create_chat(request.chat_id, current_user['id'])
+        chat_context, passages = await asyncio.gather(
+            get_chat_context(chat_id),
+            find_relevant_passages(question)
+        )
+    except BaseException:
+        ticket.release()
+        raise
+    title_task = run_in_background(update_chat_title(chat_id, question)) if needs_title else None
+    
+    user_message = ChatMessage(
+        chat_id=chat_id,
+        user_id=current_user['id'],
+        type='user',
+        content=question
+    )
+    
+    tokens = []
+    usage = {"cached": True}
+    recorded = False
+    
+    async def save_unfinished_turn():
+        """Akış yarıda kaldıysa soru ve o ana kadar gelen cevap kaybolmasın"""
+        nonlocal recorded
+        if recorded:
+            return
+        recorded = True
+        messages = [user_message]
+        answer = "".join(tokens)
+        if answer:
+            messages.append(ChatMessage(
+                chat_id=chat_id,
+                user_id=current_user['id'],
+                type='assistant',
+                content=answer,
+                usage={**usage, "partial": True}
+            ))
+        try:
+            await record_turn(chat_id, messages)
+        except Exception as e:
+            logger.error(f"Yarım kalan tur kaydedilemedi: {str(e)}")
+    
+    async def event_stream():
+        nonlocal tokens, usage, recorded
+        yield sse_event({"chat_id": chat_id, "chat_title": chat_title}, event="meta")
+        
+        with span("cache.answer"):
+            cached = await answer_cache.get(question, passages, PROMPT_VERSION) if not chat_context else None
+        if cached is not None:
+            tokens.append(cached)
+            yield sse_event({"token": cached})
+        else:
+            with span("prompt"):
+                prompt, usage = build_answer_prompt(question, chat_context, passages)
+            started = time.perf_counter()
+            try:
+                with span("llm.answer"):
+                    async for token in stream_ai_answer(prompt):
+                        tokens.append(token)
+                        yield sse_event({"token": token})
+                if not chat_context:
+                    run_in_background(answer_cache.set(question, passages, PROMPT_VERSION, "".join(tokens)))
+            except Exception as e:
+                logger.error(f"AI cevap akışı hatası: {str(e)}")
+                if not tokens:
+                    tokens = [AI_ERROR_MESSAGE]
+                    yield sse_event({"token": AI_ERROR_MESSAGE})
+        
+        answer = "".join(tokens)
+        if cached is None:
+            usage["completion_tokens"] = count_tokens(answer, ANSWER_MODEL)
+            usage["llm_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            metrics.record_tokens(ANSWER_MODEL, usage["prompt_tokens"], usage["completion_tokens"])
+        
+        # Akış bitince AI cevabını kaydet ve chat'i güncelle
+        ai_message = ChatMessage(
+            chat_id=chat_id,
+            user_id=current_user['id'],
+            type='assistant',
+            content=answer,
+            usage=usage
+        )
+        recorded = True
+        await record_turn(chat_id, [user_message, ai_message])
+        
+        yield sse_event(
+            {"answer": answer, "chat_id": chat_id, "chat_title": finished_title(title_task, chat_title), "usage": usage},
+            event="done"
+        )
+    
+    async def released_stream():
+        try:
+            async for event in event_stream():
+                yield event
+        finally:
+            ticket.release()
+            # Bağlantı koptuğunda görev iptal edilir; kayıt ayrı görevde tamamlanır
+            if not recorded:
+                await asyncio.shield(run_in_background(save_unfinished_turn()))
+    
+    async def finish_stream():
+        ticket.release()
+        await save_unfinished_turn()
+    
+    # Akış hiç başlamadan bağlantı koparsa slotu bırakma ve soruyu kaydetme arka plan görevinde
+    return StreamingResponse(
+        released_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(finish_stream)
+    )
 
 
 # Admin Routes (existing)
-@api_router.post("/upload")
+async def save_extracted_document(job: dict, content: str) -> dict:
+    """Yükleme hattından çıkan metni belge olarak kaydet ve indeksle"""
+    document = DocumentModel(
+        id=job["document_id"],
+        filename=job["filename"],
+        file_type=job["file_type"],
+        sha256=job["sha256"],
+        content_length=len(content),
+        page_count=job.get("pages_total")
+    )
+    # Önce metin: listede görünen her belgenin metni hazır olsun
+    await db.document_contents.update_one(
+        {"id": document.id}, {"$setOnInsert": {"id": document.id, "content": content}}, upsert=True
+    )
+    # İndekslenememiş belge yeniden yüklendiyse aynı kayıt tekrar indekslenir
+    fields = document.dict()
+    await db.documents.update_one(
+        {"id": document.id},
+        {"$setOnInsert": fields, "$set": {"index_status": fields.pop("index_status")}},
+        upsert=True
+    )
+    try:
+        chunk_count = await retriever.ingest(document.id, document.filename, content)
+    except Exception:
+        await db.documents.update_one({"id": document.id}, {"$set": {"index_status": "failed"}})
+        raise
+    return {"chunk_count": chunk_count}
+
+DOCUMENT_LIST_PROJECTION = {
+    "_id": 0, "id": 1, "filename": 1, "file_type": 1, "upload_date": 1, "sha256": 1,
+    "content_length": 1, "page_count": 1, "chunk_count": 1, "index_status": 1
+}
+DOCUMENT_MIGRATE_BATCH = 100
+
+async def migrate_document_contents():
+    """Metni belge kaydının içinde duran eski belgeleri document_contents'e taşı"""
+    moved = 0
+    while True:
+        batch = await db.documents.find(
+            {"content": {"$exists": True}}, {"_id": 0, "id": 1, "content": 1, "chunk_count": 1}
+        ).limit(DOCUMENT_MIGRATE_BATCH).to_list(DOCUMENT_MIGRATE_BATCH)
+        if not batch:
+            break
+        await db.document_contents.bulk_write([
+            UpdateOne({"id": doc["id"]}, {"$setOnInsert": {"id": doc["id"], "content": doc["content"]}}, upsert=True)
+            for doc in batch
+        ], ordered=False)
+        await db.documents.bulk_write([
+            UpdateOne({"id": doc["id"]}, {
+                "$set": {
+                    "content_length": len(doc["content"]),
+                    "index_status": "indexed" if "chunk_count" in doc else "pending"
+                },
+                "$unset": {"content": ""}
+            })
+            for doc in batch
+        ], ordered=False)
+        moved += len(batch)
+    if moved:
+        logger.info(f"{moved} belgenin metni document_contents'e taşındı")
+
+# Eski sürümün documents.content üzerindeki metin indeksi (arama artık ters indeksle yapılır)
+LEGACY_TEXT_INDEX = "content_text_filename_text"
+
+async def drop_legacy_text_index():
+    """Taşıma bittikten sonra artık kullanılmayan metin indeksini kaldır"""
+    if LEGACY_TEXT_INDEX in await db.documents.index_information():
+        await db.documents.drop_index(LEGACY_TEXT_INDEX)
+        logger.info(f"documents.{LEGACY_TEXT_INDEX} indeksi kaldırıldı")
+
+async def load_vectors():
+    try:
+        await retriever.load_vectors()
+    except Exception as e:
+        logger.error(f"Vektör yükleme hatası: {str(e)}")
+
+async def prepare_documents():
+    """Eski belgeleri yeni düzene taşı, sonra parçalanmamışları indeksle"""
+    try:
+        await migrate_document_contents()
+        await drop_legacy_text_index()
+    except Exception as e:
+        logger.error(f"Belge taşıma hatası: {str(e)}")
+    await retriever.backfill()
+
+# Yüklenen dosyalar arka planda işlenir
+ingest_pipeline = IngestPipeline(db, save_extracted_document)
+ingest_pipeline.declare_indexes(schema)
+
+@api_router.post("/upload", status_code=202)
 async def upload_document(file: UploadFile = File(...)):
-    """Dosya yükleme (admin)"""
+    """Dosya yükleme (admin); işlem arka planda sürer, ilerleme /upload/{job_id} ile izlenir"""
     try:
         allowed_types = {
             'application/pdf': 'pdf',
@@ -818,33 +1441,17 @@ async def upload_document(file: UploadFile = File(...)):
                 detail="Desteklenmeyen dosya tipi. Sadece PDF, Word ve TXT dosyaları yükleyebilirsiniz."
             )
         
-        file_bytes = await file.read()
-        file_type = allowed_types[file.content_type]
-        
-        if file_type == 'pdf':
-            content = extract_text_from_pdf(file_bytes)
-        elif file_type == 'docx':
-            content = extract_text_from_docx(file_bytes)
-        elif file_type == 'txt':
-            content = extract_text_from_txt(file_bytes)
-        
-        if not content.strip():
-            raise HTTPException(status_code=400, detail="Dosya içeriği boş veya okunamıyor.")
-        
-        document = DocumentModel(
-            filename=file.filename,
-            content=content,
-            file_type=file_type
-        )
-        
-        await db.documents.insert_one(document.dict())
+        job = await ingest_pipeline.submit(file, allowed_types[file.content_type])
+        if job["status"] == "queued":
+            run_in_background(ingest_pipeline.run(job["id"]))
         
         return {
-            "message": "Dosya başarıyla yüklendi",
-            "document_id": document.id,
-            "filename": document.filename,
-            "file_type": file_type,
-            "content_length": len(content)
+            "message": "Bu dosya zaten yüklü" if job.get("duplicate_of") else "Dosya alındı, işleniyor",
+            "job_id": job["id"],
+            "document_id": job["document_id"],
+            "filename": job["filename"],
+            "file_type": job["file_type"],
+            "status": job["status"]
         }
         
     except HTTPException:
@@ -853,28 +1460,113 @@ async def upload_document(file: UploadFile = File(...)):
         logger.error(f"Dosya yükleme hatası: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Dosya yükleme hatası: {str(e)}")
 
+@api_router.get("/upload/{job_id}")
+async def get_upload_status(job_id: str):
+    """Yükleme işinin durumu ve sayfa bazında ilerlemesi (admin)"""
+    job = await ingest_pipeline.status(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Yükleme işi bulunamadı")
+    return job
+
 @api_router.get("/documents")
-async def get_documents():
-    """Yüklenen belgeleri listele (admin)"""
+async def get_documents(
+    response: Response,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    file_type: Optional[str] = None,
+    index_status: Optional[str] = None,
+    q: Optional[str] = Query(None, max_length=200),
+):
+    """Yüklenen belgeleri listele (admin; en yeni önce, daha eskiler için X-Prev-Cursor ile before=)"""
+    query = {}
+    if file_type:
+        query["file_type"] = file_type
+    if index_status:
+        query["index_status"] = index_status
+    if q:
+        query["filename"] = {"$regex": re.escape(q), "$options": "i"}
+    
     try:
-        documents = await db.documents.find().to_list(1000)
-        return [
-            {
-                "id": doc["id"],
-                "filename": doc["filename"],
-                "file_type": doc["file_type"],
-                "upload_date": doc["upload_date"],
-                "content_length": len(doc["content"])
-            }
-            for doc in documents
-        ]
+        documents, prev_cursor, next_cursor = await keyset_page(
+            db.documents, query, DOCUMENT_LIST_PROJECTION, "upload_date", limit, before, after
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Belge listeleme hatası: {str(e)}")
         raise HTTPException(status_code=500, detail="Belgeler listelenemedi")
+    set_cursor_headers(response, prev_cursor, next_cursor)
+    
+    for doc in documents:
+        doc.setdefault("content_length", 0)
+        doc.setdefault("index_status", "indexed" if doc.get("chunk_count") is not None else "pending")
+    
+    return documents[::-1]
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Yönetim uçları için X-Admin-Token kontrolü"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest((x_admin_token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Yetkisiz işlem")
+
+@api_router.get("/admin/profile", dependencies=[Depends(require_admin)])
+async def capture_profile(
+    seconds: float = Query(10, gt=0, le=60),
+    interval_ms: float = Query(10, ge=1, le=1000),
+    all_threads: bool = False
+):
+    """Çalışan sunucudan örneklemeli profil (folded stacks; flamegraph.pl veya speedscope ile açılır).
+    
+    Varsayılan olarak yalnızca event loop thread'i örneklenir; all_threads=true
+    ile thread havuzları (bcrypt, belge ayrıştırma, fotoğraf işleme) da dahil olur.
+    """
+    thread_ids = None if all_threads else {loop_watchdog.loop_thread_id or threading.get_ident()}
+    try:
+        profile = await profiler.capture(seconds, interval_ms, thread_ids)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    filename = f"profile-{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}.folded"
+    return Response(
+        profile,
+        media_type="text/plain; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+CACHE_ENTRIES = metrics.REGISTRY.gauge("bilgin_cache_entries", "Bellek içi önbellekteki kayıt sayısı", ("cache",))
+CACHE_LOOKUPS = metrics.REGISTRY.counter(
+    "bilgin_cache_lookups_total", "Bellek içi önbellek okumaları", ("cache", "result")
+)
+TURNS_WRITTEN = metrics.REGISTRY.counter("bilgin_turns_written_total", "Kaydedilen sohbet turları")
+TURN_BATCHES = metrics.REGISTRY.counter("bilgin_turn_batches_total", "Tur kaydı için yapılan grup yazımları")
+ADMISSION_LIMIT = metrics.REGISTRY.gauge(
+    "bilgin_admission_limit", "Model başına aynı anda işlenebilecek istek", ("model",)
+)
+
+@metrics.REGISTRY.collector
+def collect_component_stats():
+    """Önbellek, tur kaydı ve kabul kontrolünün kendi tuttuğu sayaçları metriklere aktar"""
+    for name, cache_stats in (("user", user_cache.stats()), ("answer", answer_cache.stats())):
+        CACHE_ENTRIES.set(cache_stats["size"], cache=name)
+        CACHE_LOOKUPS.set_total(cache_stats["hits"], cache=name, result="hit")
+        CACHE_LOOKUPS.set_total(cache_stats["misses"], cache=name, result="miss")
+    turn_stats = turn_writer.stats()
+    TURNS_WRITTEN.set_total(turn_stats["turns"])
+    TURN_BATCHES.set_total(turn_stats["batches"])
+    for model, model_stats in admission.stats().items():
+        ADMISSION_LIMIT.set(model_stats["limit"], model=model)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus metrikleri (route ve aşama bazında süre histogramları, token sayaçları)"""
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
 
 # Include the router in the main app
 app.include_router(api_router)
+app.add_middleware(metrics.MetricsMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -882,6 +1574,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Prev-Cursor", "X-Next-Cursor", "Server-Timing", "Retry-After"],
 )
 
 # Configure logging
@@ -893,4 +1586,10 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    await chat_reaper.stop()
+    await turn_writer.close()
+    client.close()
+    passwords.shutdown()
+    ingest_pipeline.shutdown()
+    await llm.aclose()
+    await loop_watchdog.stop()
\ No newline at end of file
@@ -0,0 +1,171 @@
+"""Sohbet turlarının kaydı: mesajlar + chat güncellemesi tek yazımda, eşzamanlı turlar gruplanarak"""
+import asyncio
+import logging
+import os
+from typing import List, Optional
+
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+
+logger = logging.getLogger(__name__)
+
+# Tek yazımda kaydedilecek en fazla tur
+TURN_BATCH_SIZE = int(os.environ.get('TURN_BATCH_SIZE', 64))
+# >0 ise ilk turdan sonra bu kadar beklenip gelen turlar aynı gruba alınır
+TURN_FLUSH_DELAY_MS = float(os.environ.get('TURN_FLUSH_DELAY_MS', 0))
+
+
+class PartialBatchError(Exception):
+    """Transaction'sız grup yazımında chats güncellemesi yarıda kaldı; ilk `completed` tur tamam"""
+
+    def __init__(self, completed: int, error: Exception):
+        super().__init__(str(error))
+        self.completed = completed
+        self.error = error
+
+
+class TurnWriter:
+    """Tur = chat_messages'a eklenecek mesajlar + chats kaydına uygulanacak güncelleme.
+
+    Turlar bir tampona alınır; yazıcı görev tampondakileri tek insert_many ve tek
+    bulk_write ile kaydeder (group commit). Bir yazım sürerken gelen turlar bir
+    sonraki gruba girer, yük yokken ek bekleme olmaz. Replica set / mongos
+    üzerinde iki yazım tek transaction içindedir, yarım tur kalmaz.
+    Grup yazılamazsa turlar tek tek yeniden yazılır; yalnızca hatalı turun
+    save() çağrısı hata alır. Silinmiş (deleted_at) chat'lerin turları yazılmaz.
+    save() kendi turu kalıcı olunca (veya düşürülünce) döner.
+    """
+
+    def __init__(self, client, db, batch_size: int = TURN_BATCH_SIZE,
+                 flush_delay_ms: float = TURN_FLUSH_DELAY_MS):
+        self.client = client
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_delay_ms = flush_delay_ms
+        self.transactions = False
+        self._pending: List[tuple] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self.turns = 0
+        self.batches = 0
+
+    async def detect_transactions(self):
+        """Transaction yalnızca replica set ve sharded cluster'da var"""
+        try:
+            hello = await self.client.admin.command("hello")
+            self.transactions = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+        except Exception:
+            self.transactions = False
+        logger.info(f"Tur kaydı transaction {'ile' if self.transactions else 'olmadan'} yapılacak")
+
+    async def save(self, chat_id: str, messages: List[dict], chat_update: dict):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((chat_id, messages, chat_update, future))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush())
+        # İstek iptal edilse de tur yazılır
+        await asyncio.shield(future)
+
+    async def _flush(self):
+        if self.flush_delay_ms:
+            await asyncio.sleep(self.flush_delay_ms / 1000)
+        while self._pending:
+            batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+            batch = await self._live_turns(batch)
+            if not batch:
+                continue
+            try:
+                await self._write(batch)
+                errors = [None] * len(batch)
+            except Exception as e:
+                logger.error(f"Tur kaydı hatası ({len(batch)} tur): {str(e)}")
+                errors = await self._write_each(batch, e)
+            self.turns += len(batch)
+            self.batches += 1
+            for (*_, future), error in zip(batch, errors):
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+
+    async def _live_turns(self, batch: List[tuple]) -> List[tuple]:
+        """Silinmiş chat'lerin turlarını düşür; temizleyici onların mesajlarını geri getirmesin"""
+        chat_ids = list({chat_id for chat_id, *_ in batch})
+        try:
+            live = {
+                chat["id"] async for chat in self.db.chats.find(
+                    {"id": {"$in": chat_ids}, "deleted_at": None}, {"_id": 0, "id": 1}
+                )
+            }
+        except Exception as e:
+            # Kontrol yapılamazsa yazım denenir, chats güncellemesi yine deleted_at'e bakar
+            logger.error(f"Tur kaydı chat kontrolü hatası: {str(e)}")
+            return batch
+        for chat_id, _, _, future in batch:
+            if chat_id not in live:
+                logger.info(f"Silinmiş chat'in turu kaydedilmedi: {chat_id}")
+                if not future.done():
+                    future.set_result(None)
+        return [turn for turn in batch if turn[0] in live]
+
+    async def _write_each(self, batch: List[tuple], error: Exception) -> List[Optional[Exception]]:
+        """Grup hatasından sonra turları tek tek yaz; her tur için hata veya None"""
+        if len(batch) == 1:
+            return [error.error if isinstance(error, PartialBatchError) else error]
+        completed = error.completed if isinstance(error, PartialBatchError) else 0
+        errors: List[Optional[Exception]] = [None] * completed
+        for turn in batch[completed:]:
+            try:
+                await self._write_turn(turn)
+                errors.append(None)
+            except Exception as e:
+                logger.error(f"Tur kaydı hatası ({turn[0]}): {str(e)}")
+                errors.append(e)
+        return errors
+
+    async def _write_turn(self, turn: tuple):
+        if self.transactions:
+            # Grup transaction'ı geri alındı, tur baştan yazılır
+            await self._write([turn])
+            return
+        chat_id, messages, chat_update, _ = turn
+        # Transaction yoksa grup yazımı bu turun mesajlarının bir kısmını eklemiş olabilir;
+        # başka bir mesajla id çakışması yine duplicate key hatası verir
+        await self.db.chat_messages.bulk_write([
+            ReplaceOne({"id": message["id"], "chat_id": message["chat_id"]}, message, upsert=True)
+            for message in messages
+        ])
+        await self.db.chats.update_one({"id": chat_id, "deleted_at": None}, chat_update)
+
+    async def _write(self, batch: List[tuple]):
+        messages = [message for _, turn_messages, _, _ in batch for message in turn_messages]
+        # Aynı chat'in turları sırayla uygulanmalı (bağlamdaki mesaj sırası)
+        updates = [UpdateOne({"id": chat_id, "deleted_at": None}, chat_update) for chat_id, _, chat_update, _ in batch]
+        if not self.transactions:
+            await self.db.chat_messages.insert_many(messages)
+            try:
+                await self.db.chats.bulk_write(updates)
+            except BulkWriteError as e:
+                # Sıralı yazım ilk hatada durur, öncesindeki turlar tamamlandı
+                raise PartialBatchError(e.details["writeErrors"][0]["index"], e) from e
+            return
+
+        async with await self.client.start_session() as session:
+            async with session.start_transaction():
+                await self.db.chat_messages.insert_many(messages, session=session)
+                await self.db.chats.bulk_write(updates, session=session)
+
+    async def close(self):
+        """Tampondaki turları yaz"""
+        if self._flusher is not None:
+            await self._flusher
+
+    def stats(self) -> dict:
+        return {
+            "turns": self.turns,
+            "batches": self.batches,
+            "turns_per_batch": round(self.turns / self.batches, 2) if self.batches else 0.0,
+            "transactions": self.transactions,
+        }
@@ -1,7 +1,9 @@
+import os
 import requests
 import sys
 import json
 import io
+import time
 from datetime import datetime
 
 class AcademicPaperAPITester:
@@ -11,6 +13,7 @@ class AcademicPaperAPITester:
         self.tests_run = 0
         self.tests_passed = 0
         self.test_results = []
+        self.token = None
 
     def log_test(self, name, success, details=""):
         """Log test results"""
@@ -27,27 +30,33 @@ class AcademicPaperAPITester:
             "details": details
         })
 
-    def test_root_endpoint(self):
-        """Test the root API endpoint"""
+    def auth_headers(self):
+        return {'Authorization': f"Bearer {self.token}"} if self.token else {}
+
+    def test_register(self):
+        """Register a throwaway user (ask and chat endpoints need a session)"""
         try:
-            response = requests.get(f"{self.api_url}/", timeout=10)
-            success = response.status_code == 200
+            payload = {
+                "name": "Test Kullanıcı",
+                "email": f"backend-test-{datetime.now().strftime('%Y%m%d%H%M%S%f')}@gmail.com",
+                "password": "test-sifre-123"
+            }
+            response = requests.post(f"{self.api_url}/register", json=payload, timeout=10)
             
-            if success:
-                data = response.json()
-                expected_message = "Akademik Makale Soru-Cevap Sistemi"
-                if data.get("message") == expected_message:
-                    self.log_test("Root Endpoint", True)
+            if response.status_code == 200:
+                self.token = response.json().get('token')
+                if self.token:
+                    self.log_test("Register", True)
                     return True
                 else:
-                    self.log_test("Root Endpoint", False, f"Unexpected message: {data}")
+                    self.log_test("Register", False, "No token returned")
                     return False
             else:
-                self.log_test("Root Endpoint", False, f"Status code: {response.status_code}")
+                self.log_test("Register", False, f"Status code: {response.status_code}, Response: {response.text}")
                 return False
                 
         except Exception as e:
-            self.log_test("Root Endpoint", False, f"Exception: {str(e)}")
+            self.log_test("Register", False, f"Exception: {str(e)}")
             return False
 
     def test_get_documents(self):
@@ -72,26 +81,26 @@ class AcademicPaperAPITester:
             self.log_test("Get Documents", False, f"Exception: {str(e)}")
             return []
 
-    def test_get_questions(self):
-        """Test getting question history"""
+    def test_get_chats(self):
+        """Test getting the user's chat list"""
         try:
-            response = requests.get(f"{self.api_url}/questions", timeout=10)
+            response = requests.get(f"{self.api_url}/chats", headers=self.auth_headers(), timeout=10)
             success = response.status_code == 200
             
             if success:
-                questions = response.json()
-                if isinstance(questions, list):
-                    self.log_test("Get Questions History", True, f"Found {len(questions)} questions")
-                    return questions
+                chats = response.json()
+                if isinstance(chats, list):
+                    self.log_test("Get Chats", True, f"Found {len(chats)} chats")
+                    return chats
                 else:
-                    self.log_test("Get Questions History", False, "Response is not a list")
+                    self.log_test("Get Chats", False, "Response is not a list")
                     return []
             else:
-                self.log_test("Get Questions History", False, f"Status code: {response.status_code}")
+                self.log_test("Get Chats", False, f"Status code: {response.status_code}")
                 return []
                 
         except Exception as e:
-            self.log_test("Get Questions History", False, f"Exception: {str(e)}")
+            self.log_test("Get Chats", False, f"Exception: {str(e)}")
             return []
 
     def test_upload_document(self):
@@ -124,14 +133,15 @@ Anahtar kelimeler: test, akademik, makale, sistem, Türkçe
             
             response = requests.post(f"{self.api_url}/upload", files=files, timeout=30)
             
-            if response.status_code == 200:
+            # Upload is processed in the background: 202 + job id, progress via /upload/{job_id}
+            if response.status_code == 202:
                 data = response.json()
-                document_id = data.get('document_id')
-                if document_id:
-                    self.log_test("Upload Document", True, f"Document ID: {document_id}")
-                    return document_id
+                job = self.wait_for_upload(data.get('job_id'))
+                if job and job.get('status') == 'done':
+                    self.log_test("Upload Document", True, f"Document ID: {job['document_id']}")
+                    return job['document_id']
                 else:
-                    self.log_test("Upload Document", False, "No document ID returned")
+                    self.log_test("Upload Document", False, f"Upload job did not finish: {job}")
                     return None
             else:
                 self.log_test("Upload Document", False, f"Status code: {response.status_code}, Response: {response.text}")
@@ -141,6 +151,18 @@ Anahtar kelimeler: test, akademik, makale, sistem, Türkçe
             self.log_test("Upload Document", False, f"Exception: {str(e)}")
             return None
 
+    def wait_for_upload(self, job_id, attempts=60):
+        """Poll the upload job until it is done or failed"""
+        for _ in range(attempts):
+            response = requests.get(f"{self.api_url}/upload/{job_id}", timeout=10)
+            if response.status_code != 200:
+                return None
+            job = response.json()
+            if job.get('status') in ('done', 'failed'):
+                return job
+            time.sleep(1)
+        return None
+
     def test_ask_question(self, question="Bu belge ne hakkında?"):
         """Test asking a question"""
         try:
@@ -148,17 +170,16 @@ Anahtar kelimeler: test, akademik, makale, sistem, Türkçe
             response = requests.post(
                 f"{self.api_url}/ask", 
                 json=payload, 
-                headers={'Content-Type': 'application/json'},
+                headers={'Content-Type': 'application/json', **self.auth_headers()},
                 timeout=60  # Longer timeout for AI response
             )
             
             if response.status_code == 200:
                 data = response.json()
                 answer = data.get('answer')
-                relevant_doc = data.get('relevant_document_name')
                 
                 if answer:
-                    self.log_test("Ask Question", True, f"Answer received (length: {len(answer)}), Relevant doc: {relevant_doc}")
+                    self.log_test("Ask Question", True, f"Answer received (length: {len(answer)}), Chat: {data.get('chat_id')}")
                     return data
                 else:
                     self.log_test("Ask Question", False, "No answer in response")
@@ -200,7 +221,7 @@ Anahtar kelimeler: test, akademik, makale, sistem, Türkçe
             response = requests.post(
                 f"{self.api_url}/ask", 
                 json=payload, 
-                headers={'Content-Type': 'application/json'},
+                headers={'Content-Type': 'application/json', **self.auth_headers()},
                 timeout=10
             )
             
@@ -224,12 +245,12 @@ Anahtar kelimeler: test, akademik, makale, sistem, Türkçe
         
         # Test basic endpoints
         print("\n📋 Testing Basic Endpoints:")
-        self.test_root_endpoint()
+        self.test_register()
         
         # Test data retrieval
         print("\n📊 Testing Data Retrieval:")
         documents = self.test_get_documents()
-        questions = self.test_get_questions()
+        chats = self.test_get_chats()
         
         # Test document upload
         print("\n📤 Testing Document Upload:")
@@ -265,7 +286,9 @@ Anahtar kelimeler: test, akademik, makale, sistem, Türkçe
             return 1
 
 def main():
-    tester = AcademicPaperAPITester()
+    # Hedef: ilk argüman, BACKEND_TEST_URL ya da yerel sunucu
+    base_url = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("BACKEND_TEST_URL", "http://localhost:8001")
+    tester = AcademicPaperAPITester(base_url.rstrip("/"))
     return tester.run_all_tests()
 
 if __name__ == "__main__":
@@ -32,6 +32,9 @@ function App() {
   const [isAsking, setIsAsking] = useState(false);
   const [chatMessages, setChatMessages] = useState([]);
   const [chatHistory, setChatHistory] = useState([]);
+  // Daha eski mesajlar için imleç (X-Prev-Cursor); null ise en eski mesaja ulaşıldı
+  const [olderMessagesCursor, setOlderMessagesCursor] = useState(null);
+  const [loadingOlderMessages, setLoadingOlderMessages] = useState(false);
   
   // Image upload states
   const [selectedImage, setSelectedImage] = useState(null);
@@ -103,16 +106,41 @@ function App() {
     }
   };
 
-  // Chat mesajlarını yükle
+  // Chat mesajlarını yükle (en yeni sayfa)
   const loadChatMessages = async (chatId) => {
     try {
       const response = await axios.get(`${API}/chat/${chatId}/messages`, {
         headers: getAuthHeaders()
       });
       setChatMessages(response.data);
+      setOlderMessagesCursor(response.headers['x-prev-cursor'] || null);
     } catch (error) {
       console.error("Chat messages load error:", error);
       setChatMessages([]);
+      setOlderMessagesCursor(null);
+    }
+  };
+
+  // Daha eski mesajları listenin başına ekle
+  const loadOlderMessages = async () => {
+    if (!currentChatId || !olderMessagesCursor) return;
+    setLoadingOlderMessages(true);
+    try {
+      const response = await axios.get(`${API}/chat/${currentChatId}/messages`, {
+        params: { before: olderMessagesCursor },
+        headers: getAuthHeaders()
+      });
+      setChatMessages(prev => [...response.data, ...prev]);
+      setOlderMessagesCursor(response.headers['x-prev-cursor'] || null);
+    } catch (error) {
+      console.error("Older messages load error:", error);
+      toast({
+        title: "Hata",
+        description: "Eski mesajlar yüklenemedi",
+        variant: "destructive",
+      });
+    } finally {
+      setLoadingOlderMessages(false);
     }
   };
 
@@ -183,6 +211,7 @@ function App() {
     setCurrentUser(null);
     setChatHistory([]);
     setChatMessages([]);
+    setOlderMessagesCursor(null);
     setCurrentChatId(null);
     
     toast({
@@ -200,6 +229,7 @@ function App() {
       
       setCurrentChatId(response.data.chat_id);
       setChatMessages([]);
+      setOlderMessagesCursor(null);
       
       // Yeni chat'i hemen listeye ekle (başlık henüz 'Yeni Sohbet')
       const newChat = {
@@ -365,12 +395,23 @@ function App() {
     formData.append('file', file);
 
     try {
-      await axios.post(`${API}/upload`, formData, {
+      const response = await axios.post(`${API}/upload`, formData, {
         headers: {
           'Content-Type': 'multipart/form-data',
         },
       });
 
+      // Dosya arka planda işlenir, bitene kadar durumunu sorgula
+      let job = response.data;
+      while (job.status !== 'done' && job.status !== 'failed') {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        job = (await axios.get(`${API}/upload/${response.data.job_id}`)).data;
+      }
+
+      if (job.status === 'failed') {
+        throw { response: { data: { detail: job.error } } };
+      }
+
       toast({
         title: "Başarı",
         description: `${file.name} başarıyla yüklendi`,
@@ -583,6 +624,7 @@ function App() {
       if (currentChatId === chatId) {
         setCurrentChatId(null);
         setChatMessages([]);
+        setOlderMessagesCursor(null);
       }
 
       toast({
@@ -1070,9 +1112,25 @@ function App() {
             {/* Chat Messages */}
             <div className="flex-1 overflow-y-auto p-6">
               <div className="max-w-4xl mx-auto space-y-4">
+                {olderMessagesCursor && (
+                  <div className="flex justify-center">
+                    <Button
+                      onClick={loadOlderMessages}
+                      disabled={loadingOlderMessages}
+                      variant="ghost"
+                      className="text-gray-400 hover:text-white"
+                    >
+                      {loadingOlderMessages ? (
+                        <Loader2 className="h-4 w-4 animate-spin" />
+                      ) : (
+                        "Daha eski mesajları yükle"
+                      )}
+                    </Button>
+                  </div>
+                )}
                 {chatMessages.map((message, index) => (
                   <div
-                    key={index}
+                    key={message.id || index}
                     className={`flex ${message.type === 'user' ? 'justify-end' : 'justify-start'}`}
                   >
                     <div
@@ -1082,8 +1140,19 @@ function App() {
                           : 'bg-gray-800 text-white'
                       }`}
                     >
-                      {/* Fotoğraf varsa göster */}
-                      {message.image_base64 && (
+                      {/* Fotoğraf varsa göster (önizleme, tıklanınca tam boyut) */}
+                      {message.thumbnail_url ? (
+                        <div className="mb-3">
+                          <a href={`${BACKEND_URL}${message.image_url}`} target="_blank" rel="noopener noreferrer">
+                            <img
+                              src={`${BACKEND_URL}${message.thumbnail_url}`}
+                              alt="Yüklenen fotoğraf"
+                              loading="lazy"
+                              className="max-w-full max-h-60 rounded-lg border border-gray-600"
+                            />
+                          </a>
+                        </div>
+                      ) : message.image_base64 && (
                         <div className="mb-3">
                           <img
                             src={`data:image/jpeg;base64,${message.image_base64}`}
@@ -0,0 +1,7 @@
+import os
+import sys
+from pathlib import Path
+
+# Backend modülleri birbirini düz isimle içe aktarır (server.py backend/ içinden çalışır)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("LLM_BACKEND", "fake")
@@ -0,0 +1,48 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import mongomock_motor
+
+from answer_cache import AnswerCache, normalize_question
+
+
+PASSAGES = [{"id": "c2"}, {"id": "c1"}]
+
+
+def make_db():
+    return mongomock_motor.AsyncMongoMockClient()["answer_cache_test"]
+
+
+def test_normalize_question():
+    assert normalize_question("  Fotosentez NEDİR?? ") == "fotosentez nedir"
+
+
+def test_set_then_get_matches_normalized_question():
+    cache = AnswerCache(make_db(), semantic=False)
+
+    async def scenario():
+        await cache.set("Fotosentez nedir?", PASSAGES, "1", "Işıkla besin üretimi")
+        return (
+            await cache.get("fotosentez NEDİR", list(reversed(PASSAGES)), "1"),
+            await cache.get("fotosentez nedir", [{"id": "c1"}], "1"),
+            await cache.get("fotosentez nedir", PASSAGES, "2"),
+            await cache.get("?!", PASSAGES, "1"),
+        )
+
+    same, other_sources, other_prompt, empty = asyncio.run(scenario())
+    assert same == "Işıkla besin üretimi"
+    assert other_sources is None and other_prompt is None and empty is None
+
+
+def test_shared_layer_is_used_by_other_instances_until_expiry():
+    db = make_db()
+
+    async def scenario():
+        await AnswerCache(db, semantic=False).set("mitokondri nedir", PASSAGES, "1", "Enerji santrali")
+        shared = await AnswerCache(db, semantic=False).get("mitokondri nedir", PASSAGES, "1")
+        await db.answer_cache.update_many({}, {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}})
+        expired = await AnswerCache(db, semantic=False).get("mitokondri nedir", PASSAGES, "1")
+        return shared, expired
+
+    shared, expired = asyncio.run(scenario())
+    assert shared == "Enerji santrali" and expired is None
@@ -0,0 +1,85 @@
+import asyncio
+from io import BytesIO
+from urllib.parse import parse_qs, urlsplit
+
+import mongomock_motor
+import pytest
+from PIL import Image
+
+from blobstore import LocalBlobStore
+from images import strip_metadata
+from server import blob_url, parse_range, sign_blob
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=1000-", None),
+    ("bytes=5-1", None),
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+    ("bytes=a-b", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+def test_blob_url_is_signed_for_its_blob():
+    url = urlsplit(blob_url("abc"))
+    query = {key: values[0] for key, values in parse_qs(url.query).items()}
+    assert url.path == "/api/blobs/abc"
+    assert query["sig"] == sign_blob("abc", int(query["expires"]))
+    assert query["sig"] != sign_blob("other", int(query["expires"]))
+
+
+def test_strip_metadata_drops_exif_and_keeps_format():
+    exif = Image.Exif()
+    exif[0x010F] = "Kamera"
+    exif[0x0112] = 6
+    for image_format, content_type in (("JPEG", "image/jpeg"), ("PNG", "image/png"), ("WEBP", "image/webp")):
+        source = BytesIO()
+        Image.new("RGB", (40, 20), (200, 10, 10)).save(source, format=image_format, exif=exif)
+        stored, stored_type = strip_metadata(source.getvalue())
+        with Image.open(BytesIO(stored)) as image:
+            assert stored_type == content_type and image.format == image_format
+            assert not image.getexif() and image.size == (20, 40)
+
+
+def make_blob_store(tmp_path):
+    return LocalBlobStore(mongomock_motor.AsyncMongoMockClient()["blob_test"], root=str(tmp_path))
+
+
+def test_put_rewrites_bytes_missing_behind_metadata(tmp_path):
+    blob_store = make_blob_store(tmp_path)
+
+    async def scenario():
+        blob_id = await blob_store.put(b"foto", "image/jpeg")
+        blob_store._path(blob_id).unlink()
+        assert await blob_store.put(b"foto", "image/jpeg") == blob_id
+        return await blob_store.read(blob_id)
+
+    assert asyncio.run(scenario()) == b"foto"
+
+
+def test_put_racing_delete_does_not_leave_blob_broken(tmp_path):
+    blob_store = make_blob_store(tmp_path)
+    remove = blob_store._remove
+
+    async def put_then_remove(blob_id):
+        # Silme baytlara ulaşmadan aynı fotoğraf yeniden yükleniyor
+        await blob_store.put(b"foto", "image/jpeg")
+        await remove(blob_id)
+
+    async def scenario():
+        blob_id = await blob_store.put(b"foto", "image/jpeg")
+        blob_store._remove = put_then_remove
+        await blob_store.delete(blob_id)
+        blob_store._remove = remove
+        info = await blob_store.info(blob_id)
+        assert await blob_store.put(b"foto", "image/jpeg") == blob_id
+        return info, await blob_store.read(blob_id)
+
+    info, data = asyncio.run(scenario())
+    assert info is not None and "deleting" not in info and data == b"foto"
@@ -0,0 +1,99 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import mongomock_motor
+
+import ingest
+from ingest import IngestPipeline
+from schema import SchemaManager
+
+
+class Upload:
+    """UploadFile yerine: dosya adı ve parça parça okunan bayt akışı"""
+
+    def __init__(self, filename, data):
+        self.filename = filename
+        self._data = BytesIO(data)
+
+    async def read(self, size):
+        return self._data.read(size)
+
+
+def make_pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "INGEST_SPOOL_DIR", str(tmp_path))
+    db = mongomock_motor.AsyncMongoMockClient()["ingest_test"]
+    extracted = []
+
+    async def on_extracted(job, content):
+        extracted.append(content)
+        await db.documents.insert_one({"id": job["document_id"], "sha256": job["sha256"], "index_status": "indexed"})
+        return {"chunk_count": 1}
+
+    pipeline = IngestPipeline(db, on_extracted)
+    # Süreç havuzu yerine thread havuzu: testte spawn gerekmez
+    pipeline._pool = ThreadPoolExecutor(max_workers=2)
+    schema = SchemaManager(db)
+    pipeline.declare_indexes(schema)
+    asyncio.run(schema.ensure())
+    return pipeline, db, extracted
+
+
+def test_run_extracts_and_reupload_is_duplicate(tmp_path, monkeypatch):
+    pipeline, db, extracted = make_pipeline(tmp_path, monkeypatch)
+
+    async def scenario():
+        job = await pipeline.submit(Upload("not.txt", b"fotosentez nedir"), "txt")
+        await pipeline.run(job["id"])
+        again = await pipeline.submit(Upload("kopya.txt", b"fotosentez nedir"), "txt")
+        return job, await pipeline.status(job["id"]), again
+
+    job, status, again = asyncio.run(scenario())
+    assert extracted == ["fotosentez nedir"]
+    assert status["status"] == "done" and "claim" not in status
+    assert not os.path.exists(job["spool_path"])
+    assert again["status"] == "done" and again["duplicate_of"] == job["document_id"]
+    assert not os.path.exists(again["spool_path"])
+
+
+def test_concurrent_uploads_share_one_job(tmp_path, monkeypatch):
+    pipeline, db, _ = make_pipeline(tmp_path, monkeypatch)
+
+    async def scenario():
+        jobs = await asyncio.gather(*(pipeline.submit(Upload(f"{i}.txt", b"ayni icerik"), "txt") for i in range(3)))
+        return jobs, await db.ingest_jobs.count_documents({})
+
+    jobs, job_count = asyncio.run(scenario())
+    assert len({job["id"] for job in jobs}) == 1 and job_count == 1
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_run_twice_processes_once(tmp_path, monkeypatch):
+    pipeline, _, extracted = make_pipeline(tmp_path, monkeypatch)
+
+    async def scenario():
+        job = await pipeline.submit(Upload("not.txt", b"tek sefer"), "txt")
+        await asyncio.gather(pipeline.run(job["id"]), pipeline.run(job["id"]))
+
+    asyncio.run(scenario())
+    assert extracted == ["tek sefer"]
+
+
+def test_rerun_rewrites_partly_cached_batch(tmp_path, monkeypatch):
+    pipeline, db, extracted = make_pipeline(tmp_path, monkeypatch)
+    monkeypatch.setattr(ingest, "count_pages", lambda path, file_type: 3)
+    monkeypatch.setattr(
+        ingest, "extract_pages", lambda path, file_type, start, end: [f"sayfa {i}\n" for i in range(start, end)]
+    )
+
+    async def scenario():
+        job = await pipeline.submit(Upload("kitap.pdf", b"%PDF sahte"), "pdf")
+        # Önceki denemeden yalnızca ortadaki sayfa kalmış
+        await db.document_pages.insert_one({"sha256": job["sha256"], "page": 1, "text": "sayfa 1\n"})
+        await pipeline.run(job["id"])
+        return await pipeline.status(job["id"]), await db.document_pages.count_documents({})
+
+    status, page_count = asyncio.run(scenario())
+    assert status["status"] == "done" and status["pages_done"] == 3
+    assert extracted == ["sayfa 0\nsayfa 1\nsayfa 2\n"] and page_count == 3
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+from llm import FakeBackend, LlmGateway, SingleFlight
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    async def scenario():
+        flights = SingleFlight()
+        calls = 0
+
+        async def factory():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "cevap"
+
+        results = await asyncio.gather(*(flights.do("k", factory) for _ in range(5)))
+        return calls, results, len(flights)
+
+    calls, results, pending = asyncio.run(scenario())
+    assert calls == 1
+    assert [answer for answer, _ in results] == ["cevap"] * 5
+    assert sorted(shared for _, shared in results) == [False] + [True] * 4
+    assert pending == 0
+
+
+def test_single_flight_shares_errors():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def factory():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("sağlayıcı hatası")
+
+        return await asyncio.gather(*(flights.do("k", factory) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_single_flight_survives_waiter_cancellation():
+    async def scenario():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def factory():
+            await release.wait()
+            return "cevap"
+
+        first = asyncio.create_task(flights.do("k", factory))
+        second = asyncio.create_task(flights.do("k", factory))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return first, await second
+
+    first, (answer, shared) = asyncio.run(scenario())
+    assert first.cancelled()
+    assert answer == "cevap" and shared
+
+
+def test_single_flight_cancels_call_without_waiters():
+    async def scenario():
+        flights = SingleFlight()
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def factory():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiter = asyncio.create_task(flights.do("k", factory))
+        await started.wait()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        # Yeni gelen çağrı iptal edilmiş çağrıya bağlanmaz
+        answer, shared = await flights.do("k", lambda: asyncio.sleep(0, result="yeni"))
+        return answer, shared, len(flights)
+
+    assert asyncio.run(scenario()) == ("yeni", False, 0)
+
+
+def test_gateway_coalesce_calls_backend_once():
+    class CountingBackend(FakeBackend):
+        calls = 0
+
+        async def complete(self, model, system_message, text, images_base64=None):
+            CountingBackend.calls += 1
+            return await super().complete(model, system_message, text, images_base64)
+
+    async def scenario():
+        gateway = LlmGateway(CountingBackend(reply="aynı", latency_ms=20, chunk_delay_ms=0))
+        return await asyncio.gather(*(
+            gateway.complete("m", "sistem", "soru", coalesce=True) for _ in range(4)
+        ))
+
+    assert asyncio.run(scenario()) == ["aynı"] * 4
+    assert CountingBackend.calls == 1
+
+
+def test_gateway_retries_timeouts():
+    class SlowOnceBackend(FakeBackend):
+        calls = 0
+
+        async def complete(self, model, system_message, text, images_base64=None):
+            SlowOnceBackend.calls += 1
+            if SlowOnceBackend.calls == 1:
+                await asyncio.sleep(1)
+            return "tamam"
+
+    gateway = LlmGateway(SlowOnceBackend(), timeout=0.05, max_retries=1)
+    gateway.backoff = lambda attempt: 0
+    assert asyncio.run(gateway.complete("m", "sistem", "soru")) == "tamam"
+    assert SlowOnceBackend.calls == 2
+
+
+def test_gateway_does_not_retry_permanent_errors():
+    class BrokenBackend(FakeBackend):
+        calls = 0
+
+        async def complete(self, model, system_message, text, images_base64=None):
+            BrokenBackend.calls += 1
+            raise ValueError("geçersiz istek")
+
+    gateway = LlmGateway(BrokenBackend(), max_retries=3)
+    with pytest.raises(ValueError):
+        asyncio.run(gateway.complete("m", "sistem", "soru"))
+    assert BrokenBackend.calls == 1
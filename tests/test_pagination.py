@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import mongomock_motor
+import pytest
+from fastapi import HTTPException
+
+from server import decode_cursor, encode_cursor, keyset_page
+
+
+def test_cursor_round_trip():
+    timestamp = datetime(2024, 5, 1, 12, 30, 15, 123000)
+    assert decode_cursor(encode_cursor(timestamp, "abc")) == (timestamp, "abc")
+
+
+def test_invalid_cursor_is_400():
+    with pytest.raises(HTTPException) as error:
+        decode_cursor("bozuk-imlec")
+    assert error.value.status_code == 400
+
+
+def collect_pages(collection, limit):
+    """En yeni sayfadan başlayıp before imleçleriyle tüm sayfaları topla"""
+    async def scenario():
+        pages, cursor = [], None
+        while True:
+            items, cursor, _ = await keyset_page(collection, {}, {"_id": 0}, "timestamp", limit, before=cursor)
+            pages.append(items)
+            if not cursor:
+                return pages
+
+    return asyncio.run(scenario())
+
+
+def make_collection(count):
+    collection = mongomock_motor.AsyncMongoMockClient()["pagination_test"]["items"]
+    start = datetime(2024, 1, 1)
+
+    async def fill():
+        # Aynı zaman damgalı kayıtlar id ile sıralanır
+        await collection.insert_many([
+            {"id": f"{i:03d}", "timestamp": start + timedelta(seconds=i // 2)} for i in range(count)
+        ])
+
+    asyncio.run(fill())
+    return collection
+
+
+def test_keyset_page_walks_back_without_gaps_or_repeats():
+    collection = make_collection(11)
+    pages = collect_pages(collection, 3)
+    ids = [item["id"] for page in reversed(pages) for item in page]
+    assert ids == [f"{i:03d}" for i in range(11)]
+    assert [len(page) for page in pages] == [3, 3, 3, 2]
+
+
+def test_keyset_page_after_cursor_returns_newer_items():
+    collection = make_collection(6)
+
+    async def scenario():
+        items, prev_cursor, next_cursor = await keyset_page(collection, {}, {"_id": 0}, "timestamp", 2)
+        older, older_prev, older_next = await keyset_page(
+            collection, {}, {"_id": 0}, "timestamp", 2, before=prev_cursor
+        )
+        newer, _, newer_next = await keyset_page(collection, {}, {"_id": 0}, "timestamp", 2, after=older_next)
+        return items, next_cursor, older, newer, newer_next
+
+    items, next_cursor, older, newer, newer_next = asyncio.run(scenario())
+    assert [item["id"] for item in items] == ["004", "005"] and next_cursor is None
+    assert [item["id"] for item in older] == ["002", "003"]
+    assert newer == items and newer_next is None
+
+
+def test_keyset_page_rejects_both_cursors():
+    collection = make_collection(2)
+    cursor = encode_cursor(datetime(2024, 1, 1), "000")
+    with pytest.raises(HTTPException):
+        asyncio.run(keyset_page(collection, {}, {"_id": 0}, "timestamp", 2, before=cursor, after=cursor))
@@ -0,0 +1,49 @@
+from prompting import count_tokens
+from server import ANSWER_MODEL, build_answer_prompt
+
+
+QUESTION = "fotosentez nedir"
+
+
+def passage(name, words):
+    return {"filename": name, "text": " ".join([name] * words)}
+
+
+def fixed_tokens():
+    _, usage = build_answer_prompt(QUESTION)
+    return usage["system_tokens"] + usage["question_tokens"]
+
+
+def source_tokens(item):
+    return count_tokens(f"[{item['filename']}]\n{item['text']}", ANSWER_MODEL)
+
+
+def test_lowest_scored_passage_is_dropped_first():
+    # Pasajlar skor sırasıyla gelir; sığmayan en düşük skorlu olandır
+    passages = [passage(name, 80) for name in ("birinci", "ikinci", "ucuncu")]
+    sizes = [source_tokens(item) for item in passages]
+    budget = fixed_tokens() + sizes[0] + sizes[1] + sizes[2] - 1
+
+    prompt, usage = build_answer_prompt(QUESTION, passages=passages, budget=budget)
+    assert usage["dropped_passages"] == 1
+    assert "[birinci]" in prompt and "[ikinci]" in prompt and "[ucuncu]" not in prompt
+    assert usage["prompt_tokens"] <= budget
+
+
+def test_smaller_later_passage_still_fits():
+    passages = [passage("uzun", 200), passage("kisa", 10)]
+    budget = fixed_tokens() + source_tokens(passages[1]) + 5
+
+    prompt, usage = build_answer_prompt(QUESTION, passages=passages, budget=budget)
+    assert usage["dropped_passages"] == 1 and "[kisa]" in prompt and "[uzun]" not in prompt
+
+
+def test_oldest_history_is_dropped_first():
+    passages = [passage("kaynak", 10)]
+    history = [f"Kullanıcı: soru{i} " + "kelime " * 60 for i in range(3)]
+    history_sizes = [count_tokens(turn, ANSWER_MODEL) for turn in history]
+    budget = fixed_tokens() + source_tokens(passages[0]) + sum(history_sizes) - 1
+
+    prompt, usage = build_answer_prompt(QUESTION, history, passages, budget=budget)
+    assert usage["dropped_history"] == 1 and usage["dropped_passages"] == 0
+    assert "soru0" not in prompt and "soru1" in prompt and "soru2" in prompt
@@ -0,0 +1,60 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import mongomock_motor
+
+from blobstore import LocalBlobStore
+from reaper import ChatReaper
+
+
+def make_reaper(tmp_path, grace=60):
+    db = mongomock_motor.AsyncMongoMockClient()["reaper_test"]
+    blob_store = LocalBlobStore(db, root=str(tmp_path))
+    return ChatReaper(db, blob_store, batch_size=2, pause_ms=0, grace=grace), db, blob_store
+
+
+async def add_chat(db, chat_id, deleted_at, images):
+    await db.chats.insert_one({"id": chat_id, "user_id": "u1", "deleted_at": deleted_at})
+    await db.chat_messages.insert_many([
+        {"id": f"{chat_id}-{i}", "chat_id": chat_id, "image_id": image_id, "thumbnail_id": None}
+        for i, image_id in enumerate(images)
+    ])
+
+
+def test_reap_removes_expired_chats_and_unshared_blobs(tmp_path):
+    reaper, db, blob_store = make_reaper(tmp_path)
+    long_ago = datetime.now(timezone.utc) - timedelta(hours=1)
+
+    async def scenario():
+        shared = await blob_store.put(b"ortak", "image/jpeg")
+        own = await blob_store.put(b"yalniz", "image/jpeg")
+        # Blob'lar bekleme süresinden önce kullanılmış olsun
+        await db.blobs.update_many({}, {"$set": {"last_used_at": long_ago}})
+        await add_chat(db, "silinen", long_ago, [shared, own, None])
+        await add_chat(db, "yeni-silinen", datetime.now(timezone.utc), [None])
+        await add_chat(db, "duran", None, [shared])
+        reaped = await reaper.reap()
+        chats = sorted([chat["id"] async for chat in db.chats.find()])
+        messages = sorted([message["id"] async for message in db.chat_messages.find()])
+        return reaped, chats, messages, await blob_store.info(shared), await blob_store.info(own)
+
+    reaped, chats, messages, shared_info, own_info = asyncio.run(scenario())
+    assert reaped == 1
+    assert chats == ["duran", "yeni-silinen"]
+    assert messages == ["duran-0", "yeni-silinen-0"]
+    assert shared_info is not None and own_info is None
+
+
+def test_reap_keeps_blob_reused_within_grace(tmp_path):
+    reaper, db, blob_store = make_reaper(tmp_path)
+    long_ago = datetime.now(timezone.utc) - timedelta(hours=1)
+
+    async def scenario():
+        # Fotoğraf az önce başka bir sohbete yüklendi, mesajı henüz yazılmadı
+        blob_id = await blob_store.put(b"yeniden", "image/jpeg")
+        await add_chat(db, "silinen", long_ago, [blob_id])
+        await reaper.reap()
+        return await blob_store.info(blob_id), await blob_store.read(blob_id)
+
+    info, data = asyncio.run(scenario())
+    assert info is not None and data == b"yeniden"
@@ -0,0 +1,72 @@
+import asyncio
+
+import mongomock_motor
+
+from retrieval import InvertedIndex, chunk_text
+
+
+def test_chunks_cover_text_with_overlap():
+    text = " ".join(f"kelime{i}" for i in range(400))
+    spans = chunk_text(text, size=200, overlap=50)
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+    for (start, end), (next_start, _) in zip(spans, spans[1:]):
+        assert end - start <= 200
+        assert start < next_start < end
+
+
+def test_chunks_end_on_word_boundaries():
+    text = " ".join(f"kelime{i}" for i in range(400))
+    for start, end in chunk_text(text, size=200, overlap=50):
+        assert start == 0 or text[start - 1] == " "
+        assert end == len(text) or text[end] == " "
+
+
+def test_short_and_empty_text():
+    assert chunk_text("kısa metin", size=200, overlap=50) == [(0, 10)]
+    assert chunk_text("", size=200, overlap=50) == []
+
+
+def test_text_without_spaces_still_progresses():
+    spans = chunk_text("x" * 1000, size=200, overlap=50)
+    assert spans[-1][1] == 1000
+    assert all(end - start == 200 for start, end in spans[:-1])
+
+
+def search(items, query, limit=5, repeat_add=False):
+    index = InvertedIndex(mongomock_motor.AsyncMongoMockClient()["index_test"])
+
+    async def scenario():
+        await index.add_documents(items)
+        if repeat_add:
+            # Yarım kalan ingest tekrarlanınca aynı birimler ikinci kez sayılmaz
+            assert await index.add_documents(items) == 0
+        results = await index.search(query, limit=limit)
+        return results, await index.db.index_stats.find_one({"_id": "global"})
+
+    return asyncio.run(scenario())
+
+
+def test_bm25_ranks_rare_term_matches_first():
+    items = [
+        ("ortak", "hücre hücre hücre zar sitoplazma", "biyoloji.txt"),
+        ("nadir", "hücre mitokondri enerji", "biyoloji.txt"),
+        ("alakasiz", "osmanlı tarihi padişah", "tarih.txt"),
+    ]
+    results, _ = search(items, "mitokondri hücre")
+    assert [doc_id for doc_id, _ in results] == ["nadir", "ortak"]
+    assert results[0][1] > results[1][1] > 0
+
+
+def test_bm25_filename_terms_count_and_limit_applies():
+    items = [(f"p{i}", "genel bir metin", f"belge{i}.txt") for i in range(3)]
+    items.append(("fotosentez", "genel bir metin", "fotosentez.txt"))
+    results, _ = search(items, "fotosentez", limit=1)
+    assert [doc_id for doc_id, _ in results] == ["fotosentez"]
+    assert len(search(items, "metin", limit=2)[0]) == 2
+
+
+def test_bm25_empty_query_and_repeated_add():
+    items = [("a", "kuantum fiziği", "fizik.txt"), ("b", "klasik mekanik", "fizik.txt")]
+    assert search(items, "ve ile")[0] == []
+    results, stats = search(items, "kuantum", repeat_add=True)
+    assert [doc_id for doc_id, _ in results] == ["a"] and stats["doc_count"] == 2
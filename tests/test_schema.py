@@ -0,0 +1,29 @@
+import asyncio
+
+import mongomock_motor
+
+from schema import SchemaManager
+
+
+def test_failing_index_does_not_skip_the_rest():
+    db = mongomock_motor.AsyncMongoMockClient()["schema_test"]
+    schema = SchemaManager(db)
+    schema.index("bozuk", "id", unique=True)
+    schema.index("answer_cache", "expires_at", expireAfterSeconds=0)
+    schema.index("index_postings", [("term", 1), ("doc_id", 1)], unique=True)
+    create = schema._create
+
+    async def failing_create(collection, model):
+        if collection.name == "bozuk":
+            raise RuntimeError("indeks kurulamadı")
+        await create(collection, model)
+
+    schema._create = failing_create
+
+    async def scenario():
+        await schema.ensure()
+        return await db.answer_cache.index_information(), await db.index_postings.index_information()
+
+    cache_indexes, posting_indexes = asyncio.run(scenario())
+    assert cache_indexes["expires_at_1"]["expireAfterSeconds"] == 0
+    assert posting_indexes["term_1_doc_id_1"]["unique"]
@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime, timezone
+
+import mongomock_motor
+import pytest
+from pymongo.errors import BulkWriteError
+
+from turns import TurnWriter
+
+
+def make_writer():
+    client = mongomock_motor.AsyncMongoMockClient()
+    db = client["turns_test"]
+    return TurnWriter(client, db), db
+
+
+def turn(writer, chat_id, message_ids):
+    messages = [{"id": message_id, "chat_id": chat_id} for message_id in message_ids]
+    return writer.save(chat_id, messages, {"$inc": {"message_count": len(messages)}})
+
+
+async def create_chats(db, *chat_ids, **fields):
+    await db.chat_messages.create_index("id", unique=True)
+    await db.chats.insert_many([{"id": chat_id, "message_count": 0, **fields} for chat_id in chat_ids])
+
+
+def test_concurrent_turns_are_grouped():
+    async def scenario():
+        writer, db = make_writer()
+        await create_chats(db, "c0", "c1")
+        await asyncio.gather(*(turn(writer, f"c{i % 2}", [f"m{i}a", f"m{i}b"]) for i in range(10)))
+        counts = {chat["id"]: chat["message_count"] async for chat in db.chats.find()}
+        return writer.stats(), counts, await db.chat_messages.count_documents({})
+
+    stats, counts, messages = asyncio.run(scenario())
+    assert stats["turns"] == 10 and stats["batches"] < 10
+    assert counts == {"c0": 10, "c1": 10} and messages == 20
+
+
+def test_failing_turn_only_errors_its_own_request():
+    async def scenario():
+        writer, db = make_writer()
+        await create_chats(db, "c0", "c1", "c2")
+        await db.chat_messages.insert_one({"id": "taken", "chat_id": "other"})
+        results = await asyncio.gather(
+            turn(writer, "c0", ["a0", "a1"]),
+            turn(writer, "c1", ["b0", "taken"]),
+            turn(writer, "c2", ["c0", "c1"]),
+            return_exceptions=True
+        )
+        counts = {chat["id"]: chat["message_count"] async for chat in db.chats.find()}
+        return results, counts, await db.chat_messages.count_documents({"chat_id": {"$in": ["c0", "c2"]}})
+
+    results, counts, messages = asyncio.run(scenario())
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], BulkWriteError)
+    assert counts["c0"] == 2 and counts["c2"] == 2 and counts["c1"] == 0
+    assert messages == 4
+
+
+def test_single_turn_error_propagates():
+    async def scenario():
+        writer, db = make_writer()
+        await create_chats(db, "c0")
+        await db.chat_messages.insert_one({"id": "taken", "chat_id": "other"})
+        await turn(writer, "c0", ["taken"])
+
+    with pytest.raises(BulkWriteError):
+        asyncio.run(scenario())
+
+
+def test_turns_of_deleted_chats_are_dropped():
+    async def scenario():
+        writer, db = make_writer()
+        await create_chats(db, "live")
+        await create_chats(db, "gone", deleted_at=datetime.now(timezone.utc))
+        await asyncio.gather(turn(writer, "live", ["l0"]), turn(writer, "gone", ["g0"]))
+        return [message["id"] async for message in db.chat_messages.find()]
+
+    assert asyncio.run(scenario()) == ["l0"]